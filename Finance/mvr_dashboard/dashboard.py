@@ -8,18 +8,37 @@ Alternatively, a single-month export will work too.
 USAGE:
     python3 dashboard.py                    # Process most recent CSV
     python3 dashboard.py myfile.csv         # Process specific file
+    python3 dashboard.py --all              # Every month of every CSV in data/ (backfills reports/)
+    python3 dashboard.py --all exports/ "old/*.csv"
+    python3 dashboard.py --no-cache         # Re-parse instead of using the cached parse in .cache/
 """
 
 import csv
+import glob
+import hashlib
 import json
+import os
+import pickle
+import re
 import sys
+from array import array
+from operator import add
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional: only the month x account matrix and the trend lines need it
 
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR / "data"
 OUTPUT_DIR = SCRIPT_DIR / "reports"
+CACHE_DIR = SCRIPT_DIR / ".cache"
+# Bump whenever parse_qbo_pnl's output changes, so cached parses from older code are ignored
+PARSER_VERSION = 1
 
 TARGETS = {
     'revenue': 150000,
@@ -29,6 +48,16 @@ TARGETS = {
     'contract_labor_max_pct': 0.25
 }
 
+# Years that mark a cell as a period ("January 2025", "January-December, 2025")
+PERIOD_YEARS = ('2024', '2025', '2026')
+HEADER_FIRST_CELLS = ('account', 'distribution account', '')
+# Expense categories tracked even outside the Expenses section
+EXPENSE_KEYWORDS = ('contract labor', 'salaries', 'software', 'insurance',
+                    'accounting', 'benefits', 'travel', 'consulting')
+# Computed lines of the report, not accounts - kept in the tree but left out of rollups
+SUMMARY_LABELS = ('gross profit', 'net operating income', 'net other income', 'net income')
+SUBTOTAL_TOLERANCE = 0.01
+
 
 def find_latest_csv():
     DATA_DIR.mkdir(exist_ok=True)
@@ -41,6 +70,10 @@ def find_latest_csv():
 def parse_value(val_str):
     if not val_str:
         return 0
+    try:
+        return float(val_str)  # Plain numbers; anything with commas, $ or quotes falls through
+    except ValueError:
+        pass
     val_str = str(val_str).replace(',', '').replace('$', '').replace('"', '').strip()
     if not val_str or val_str == '-':
         return 0
@@ -50,145 +83,532 @@ def parse_value(val_str):
         return 0
 
 
-def parse_qbo_pnl(filepath):
-    """Parse QuickBooks P&L CSV export - handles both monthly and single-period formats"""
-    with open(filepath, 'r', encoding='utf-8-sig') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
+def has_year(text):
+    return any(year in text for year in PERIOD_YEARS)
+
+
+def period_year(label):
+    """The (last) calendar year in a period label - "2025" for "January 2025" - or None."""
+    years = re.findall(r'\b(?:19|20)\d{2}\b', label)
+    return years[-1] if years else None
+
+
+class AccountTree:
+    """
+    The P&L's account hierarchy, stored as flat arrays in file order: node i has parent[i],
+    and its subtree is nodes i .. end[i] - 1. Own amounts are one row of `months` values per node
+    in a single array; rollups add each node into its parent in one reverse pass. "Total for X"
+    rows aren't nodes - their amounts are kept to verify the rollup against.
+
+    QuickBooks only marks a parent account with its "Total for X" row, so a row with amounts
+    becomes a parent when that row arrives. When several earlier rows share the label (like
+    the two Advertising rows), the one whose subtree adds up to the total is used.
+    """
+    ROOT = 0
+    ACCOUNT, SUMMARY = 0, 1
+
+    def __init__(self, months):
+        self.months = list(months)
+        self.labels = ['P&L']
+        self.parent = array('i', [-1])
+        self.kind = array('b', [self.ACCOUNT])
+        self.own = array('d', [0.0] * len(self.months))
+        self.reported = {}  # node -> subtotal from its "Total for" row
+        self.stack = [self.ROOT]  # Open parents, innermost last
+        self.open_children = {}  # Open parent -> its direct children so far
+        self.pending = None  # (label, values) of a row without amounts - a heading if children follow
+        self._end = self._totals = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _add(self, label, parent, values, kind=ACCOUNT):
+        self.labels.append(label)
+        self.parent.append(parent)
+        self.kind.append(kind)
+        self.own.extend(values)
+        self._end = self._totals = None
+        node = len(self.labels) - 1
+        self.open_children.setdefault(parent, []).append(node)
+        return node
+
+    def _flush_pending(self):
+        if self.pending:
+            label, values = self.pending
+            self.stack.append(self._add(label, self.stack[-1], values))
+            self.pending = None
+
+    def add_row(self, label, values, blank):
+        """Feed one data row: `values` per month, `blank` when the row has no amounts at all."""
+        lower = label.lower()
+        if lower.startswith('total for ') or lower.startswith('total '):
+            name = lower[10:] if lower.startswith('total for ') else lower[6:]
+            self._flush_pending()  # A heading closed straight away still gets its node
+            self._close(name, values)
+            return
+        if lower in SUMMARY_LABELS:
+            self.pending = None
+            self._close_all()
+            self._add(label, self.ROOT, values, self.SUMMARY)
+            return
+        self._flush_pending()
+        if blank:
+            self.pending = (label, values)
+        else:
+            self._add(label, self.stack[-1], values)
+
+    def _close(self, name, subtotal):
+        # An open heading: close it (and anything left open inside it)
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.labels[self.stack[depth]].lower() == name:
+                self.reported[self.stack[depth]] = subtotal
+                for node in self.stack[depth:]:
+                    self.open_children.pop(node, None)
+                del self.stack[depth:]
+                return
+        # Otherwise an account with amounts of its own: it adopts the siblings that follow it
+        parent = self.stack[-1]
+        siblings = self.open_children.setdefault(parent, [])
+        candidates = [pos for pos, i in enumerate(siblings) if self.labels[i].lower() == name]
+        if not candidates:
+            return
+        # Everything added since the open parent is inside it, so the candidate's subtree plus its
+        # later siblings' subtrees is just every account from the candidate on: one suffix sum
+        m = len(self.months)
+        first = siblings[candidates[0]]
+        sums = [0.0] * m
+        matches = {}
+        for i in range(len(self) - 1, first - 1, -1):
+            if self.kind[i] == self.ACCOUNT:
+                sums = list(map(add, sums, self.own[i * m:(i + 1) * m]))
+            matches[i] = all(abs(a - b) <= SUBTOTAL_TOLERANCE for a, b in zip(sums, subtotal))
+        chosen = next((pos for pos in candidates if matches[siblings[pos]]), candidates[0])
+        node = siblings[chosen]
+        for sib in siblings[chosen + 1:]:
+            self.parent[sib] = node
+        del siblings[chosen + 1:]
+        self.reported[node] = subtotal
+        self._end = self._totals = None
+
+    def _close_all(self):
+        for node in self.stack[1:]:
+            self.open_children.pop(node, None)
+        del self.stack[1:]
+
+    def finish(self):
+        """End of data: a heading nothing followed (like the report footer) isn't an account."""
+        self.pending = None
+        self._close_all()
+        self.open_children.clear()
+
+    @property
+    def end(self):
+        if self._end is None:
+            end = array('i', range(1, len(self) + 1))
+            for i in range(len(self) - 1, 0, -1):
+                p = self.parent[i]
+                if end[i] > end[p]:
+                    end[p] = end[i]
+            self._end = end
+        return self._end
+
+    def rollup(self):
+        """Totals per node (own amounts plus all descendant accounts), in the same flat layout as `own`."""
+        if self._totals is None:
+            m = len(self.months)
+            totals = array('d', self.own)
+            for i in range(len(self) - 1, 0, -1):
+                if self.kind[i] == self.ACCOUNT:
+                    base, pbase = i * m, self.parent[i] * m
+                    totals[pbase:pbase + m] = array('d', map(add, totals[pbase:pbase + m], totals[base:base + m]))
+            self._totals = totals
+        return self._totals
+
+    def total(self, i, month=None):
+        m = len(self.months)
+        totals = self.rollup()
+        if month is not None:
+            return totals[i * m + self.months.index(month)]
+        return list(totals[i * m:(i + 1) * m])
+
+    def children(self, i):
+        kids, j, end = [], i + 1, self.end
+        while j < end[i]:
+            kids.append(j)
+            j = end[j]
+        return kids
+
+    def find(self, label, parent=None):
+        """Nodes with this label (case-insensitive), optionally only direct children of `parent`."""
+        lower = label.lower()
+        nodes = self.children(parent) if parent is not None else range(1, len(self))
+        return [i for i in nodes if self.labels[i].lower() == lower]
+
+    def path(self, i):
+        parts = []
+        while i > self.ROOT:
+            parts.append(self.labels[i])
+            i = self.parent[i]
+        return ' > '.join(reversed(parts))
+
+    def breakdown(self, i, month):
+        """Child label -> rolled-up amount for one month (children sharing a label are added together)."""
+        result = {}
+        for child in self.children(i):
+            if self.kind[child] == self.ACCOUNT:
+                result[self.labels[child]] = result.get(self.labels[child], 0) + self.total(child, month)
+        return {label: round(value, 2) for label, value in result.items()}
+
+    def walk(self, i=ROOT):
+        """(node, depth) for the subtree under i, in report order."""
+        depth = {i: 0}
+        for j in range(i + 1, self.end[i]):
+            depth[j] = depth[self.parent[j]] + 1
+            yield j, depth[j]
+
+    def verify(self, tolerance=SUBTOTAL_TOLERANCE):
+        """[(path, month, rolled up, reported)] wherever a "Total for" row disagrees with its accounts."""
+        mismatches = []
+        for i, reported in sorted(self.reported.items()):
+            for month, computed, expected in zip(self.months, self.total(i), reported):
+                if abs(computed - expected) > tolerance:
+                    mismatches.append((self.path(i), month, computed, expected))
+        return mismatches
+
+
+class PnLSection:
+    """Accumulates the data rows that follow one header row."""
+
+    def __init__(self, headers, report_period):
+        # Determine if this is monthly breakdown or single period
+        months = []
+        month_indices = []
+        total_col_idx = None
+
+        for i, h in enumerate(headers):
+            h_str = str(h).strip()
+            if h_str.lower() == 'total':
+                total_col_idx = i
+            elif h_str and has_year(h_str):
+                months.append(h_str)
+                month_indices.append(i)
+
+        # If no month columns found, this is a single-period report - use Total column
+        self.is_single_period = len(months) == 0
+        if self.is_single_period:
+            if total_col_idx is None:
+                # Find first numeric column
+                for i, h in enumerate(headers):
+                    if i > 0 and str(h).strip():
+                        total_col_idx = i
+                        break
+            if total_col_idx is None:
+                total_col_idx = 1  # Default to second column
+
+            months = [report_period]
+            month_indices = [total_col_idx]
+
+        self.months = months
+        self.columns = list(zip(month_indices, months))
+        self.revenue_by_month = {m: 0 for m in months}
+        self.expenses_by_month = {m: 0 for m in months}
+        self.expense_detail = defaultdict(lambda: {m: 0 for m in months})
+        self.net_income_by_month = {m: 0 for m in months}
+        self.in_expenses = False
+        self.tree = AccountTree(months)
+
+    def _fill(self, target, values, n):
+        for (mi, month), val in zip(self.columns, values):
+            if mi < n:
+                target[month] = val
+
+    def add_row(self, row):
+        n = len(row)
+        if n < 2:
+            return
+
+        label = str(row[0]).strip()
+        lower = label.lower()
+        values = [parse_value(row[mi]) if mi < n and row[mi] else 0 for mi, _ in self.columns]
+        self.tree.add_row(label, values, blank=not any(str(c).strip() for c in row[1:]))
 
-    # Extract report period from header rows
+        # Track when we're in expenses section
+        if lower == 'expenses':
+            self.in_expenses = True
+            return
+        is_net = 'net operating income' in lower or 'net income' in lower
+        if is_net:
+            self.in_expenses = False
+
+        if lower == 'total for income' or lower == 'total income':
+            self._fill(self.revenue_by_month, values, n)
+        # Gross Profit (backup for revenue if no "Total for Income")
+        elif lower == 'gross profit' and not any(self.revenue_by_month.values()):
+            self._fill(self.revenue_by_month, values, n)
+        elif lower == 'total for expenses' or lower == 'total expenses':
+            self._fill(self.expenses_by_month, values, n)
+        elif is_net:
+            self._fill(self.net_income_by_month, values, n)
+
+        # Track expense categories (when in expenses section or matches key terms)
+        if (self.in_expenses or any(kw in lower for kw in EXPENSE_KEYWORDS)) and not lower.startswith('total'):
+            for (_, month), val in zip(self.columns, values):
+                if val > 0:
+                    self.expense_detail[label][month] = val
+
+    def results(self, report_period):
+        if self.is_single_period and self.months != [report_period]:
+            # The period turned up in the first rows after the header row - relabel the column
+            old = self.months[0]
+            for by_month in (self.revenue_by_month, self.expenses_by_month, self.net_income_by_month,
+                             *self.expense_detail.values()):
+                by_month[report_period] = by_month.pop(old)
+            self.months = [report_period]
+        self.tree.months = self.months
+        self.tree.finish()
+        total_revenue = sum(self.revenue_by_month.values())
+        total_expenses = sum(self.expenses_by_month.values())
+        return {
+            'months': self.months,
+            'report_period': report_period,
+            'is_single_period': self.is_single_period,
+            'revenue_by_month': self.revenue_by_month,
+            'expenses_by_month': self.expenses_by_month,
+            'expense_detail': dict(self.expense_detail),  # Plain dict so results can be pickled
+            'net_income_by_month': self.net_income_by_month,
+            'tree': self.tree,
+            'total_revenue': total_revenue,
+            'total_expenses': total_expenses,
+            'total_net_income': total_revenue - total_expenses,
+        }
+
+
+def is_header_row(row):
+    """An "Account"/"Distribution account" row followed by period or Total columns."""
+    if str(row[0]).strip().lower() not in HEADER_FIRST_CELLS or len(row) < 2:
+        return False
+    return 'total' in str(row[-1]).lower() or any(has_year(str(c)) for c in row)
+
+
+def is_fallback_header_row(row):
+    """Looser match, used only if no row passes is_header_row()."""
+    return len(row) >= 2 and ('Total' in str(row[-1]) or 'Total' in str(row[1]))
+
+
+def parse_qbo_pnl(filepath):
+    """
+    Parse QuickBooks P&L CSV export - handles both monthly and single-period formats.
+
+    Reads the file once, row by row, so memory stays flat however long the export is:
+    the report period comes from the first rows, data rows are accumulated from the header
+    row on. Until a proper header row turns up, rows are also accumulated speculatively
+    from the first fallback header, which is used only if the file has no proper header.
+    """
     report_period = "Current Period"
-    for row in rows[:5]:
-        for cell in row:
-            if '2024' in str(cell) or '2025' in str(cell) or '2026' in str(cell):
-                if '-' in str(cell) or 'January' in str(cell) or 'February' in str(cell):
-                    report_period = str(cell).strip()
-                    break
-
-    # Find the header row - look for "Account" or "Distribution account"
-    header_idx = None
-    for i, row in enumerate(rows):
-        if row:
-            first_cell = str(row[0]).strip().lower()
-            if first_cell in ['account', 'distribution account', '']:
-                # Check if next cells look like headers
-                if len(row) > 1 and ('total' in str(row[-1]).lower() or any('2025' in str(c) or '2026' in str(c) for c in row)):
-                    header_idx = i
-                    break
-
-    if header_idx is None:
-        # Try another approach - find row with "Total" header
-        for i, row in enumerate(rows):
-            if row and len(row) >= 2:
-                if 'Total' in str(row[-1]) or 'Total' in str(row[1]):
-                    header_idx = i
-                    break
-
-    if header_idx is None:
+    preview = []  # First rows, for the error message
+    section = None
+    fallback = None
+
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        for i, row in enumerate(csv.reader(f)):
+            if i < 10:
+                preview.append(row)
+            # Extract report period from header rows
+            if i < 5:
+                for cell in row:
+                    cell = str(cell)
+                    if has_year(cell) and ('-' in cell or 'January' in cell or 'February' in cell):
+                        report_period = cell.strip()
+                        break
+            if not row:
+                continue
+
+            if section is not None:
+                section.add_row(row)
+            elif is_header_row(row):
+                section = PnLSection(row, report_period)
+                fallback = None
+            elif fallback is not None:
+                fallback.add_row(row)
+            elif is_fallback_header_row(row):
+                fallback = PnLSection(row, report_period)
+
+    section = section or fallback
+    if section is None:
         print(f"Could not find header row. First few rows:")
-        for i, row in enumerate(rows[:10]):
+        for i, row in enumerate(preview):
             print(f"  {i}: {row[:3]}...")
         return None
 
-    headers = rows[header_idx]
-
-    # Determine if this is monthly breakdown or single period
-    months = []
-    month_indices = []
-    total_col_idx = None
-
-    for i, h in enumerate(headers):
-        h_str = str(h).strip()
-        if h_str.lower() == 'total':
-            total_col_idx = i
-        elif h_str and ('2024' in h_str or '2025' in h_str or '2026' in h_str):
-            months.append(h_str)
-            month_indices.append(i)
-
-    # If no month columns found, this is a single-period report - use Total column
-    is_single_period = len(months) == 0
-    if is_single_period:
-        if total_col_idx is None:
-            # Find first numeric column
-            for i, h in enumerate(headers):
-                if i > 0 and str(h).strip():
-                    total_col_idx = i
-                    break
-        if total_col_idx is None:
-            total_col_idx = 1  # Default to second column
-
-        months = [report_period]
-        month_indices = [total_col_idx]
-
-    results = {
-        'months': months,
-        'report_period': report_period,
-        'is_single_period': is_single_period,
-        'revenue_by_month': {m: 0 for m in months},
-        'expenses_by_month': {m: 0 for m in months},
-        'expense_detail': defaultdict(lambda: {m: 0 for m in months}),
-        'net_income_by_month': {m: 0 for m in months},
-    }
+    return section.results(report_period)
 
-    # Parse data rows
-    in_expenses = False
-    for row in rows[header_idx + 1:]:
-        if not row or len(row) < 2:
-            continue
 
-        label = str(row[0]).strip()
+def parse_cache_path(csv_path):
+    """The pickle sidecar for one export: named after the file, plus a hash of its full path
+    so same-named exports in different folders don't share an entry."""
+    path_hash = hashlib.blake2b(str(Path(csv_path).resolve()).encode(), digest_size=4).hexdigest()
+    return CACHE_DIR / f"{Path(csv_path).name}.{path_hash}.pickle"
 
-        # Track when we're in expenses section
-        if label.lower() == 'expenses':
-            in_expenses = True
-            continue
-        if 'net operating income' in label.lower() or 'net income' in label.lower():
-            in_expenses = False
-
-        # Total Income
-        if label.lower() == 'total for income' or label.lower() == 'total income':
-            for mi, month in zip(month_indices, months):
-                if mi < len(row):
-                    results['revenue_by_month'][month] = parse_value(row[mi])
 
-        # Gross Profit (backup for revenue if no "Total for Income")
-        elif label.lower() == 'gross profit' and all(v == 0 for v in results['revenue_by_month'].values()):
-            for mi, month in zip(month_indices, months):
-                if mi < len(row):
-                    results['revenue_by_month'][month] = parse_value(row[mi])
-
-        # Total Expenses
-        elif label.lower() == 'total for expenses' or label.lower() == 'total expenses':
-            for mi, month in zip(month_indices, months):
-                if mi < len(row):
-                    results['expenses_by_month'][month] = parse_value(row[mi])
-
-        # Net Income
-        elif 'net income' in label.lower() or 'net operating income' in label.lower():
-            for mi, month in zip(month_indices, months):
-                if mi < len(row):
-                    results['net_income_by_month'][month] = parse_value(row[mi])
-
-        # Track expense categories (when in expenses section or matches key terms)
-        expense_keywords = ['contract labor', 'salaries', 'software', 'insurance',
-                          'accounting', 'benefits', 'travel', 'consulting']
-        if in_expenses or any(kw in label.lower() for kw in expense_keywords):
-            if not label.lower().startswith('total'):
-                for mi, month in zip(month_indices, months):
-                    if mi < len(row):
-                        val = parse_value(row[mi])
-                        if val > 0:
-                            results['expense_detail'][label][month] = val
-
-    # Calculate totals
-    results['total_revenue'] = sum(results['revenue_by_month'].values())
-    results['total_expenses'] = sum(results['expenses_by_month'].values())
-    results['total_net_income'] = results['total_revenue'] - results['total_expenses']
-
-    return results
+def load_pnl(csv_path, use_cache=True):
+    """
+    parse_qbo_pnl through a pickle sidecar in .cache/. The sidecar records the export's content
+    hash and PARSER_VERSION and is only used while both still match, so an edited or re-exported
+    CSV (or a parser change) is re-parsed and the sidecar overwritten. Failed parses aren't cached.
+    """
+    if not use_cache:
+        return parse_qbo_pnl(csv_path)
 
+    # Hashed in chunks so a large export is never held in memory whole
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    cache_file = parse_cache_path(csv_path)
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = pickle.load(f)
+        if entry['version'] == PARSER_VERSION and entry['hash'] == digest:
+            return entry['data']
+    except Exception:
+        pass  # Missing, unreadable or from an older layout - re-parse
 
-def generate_dashboard(data, month=None):
+    data = parse_qbo_pnl(csv_path)
+    if data:
+        try:
+            CACHE_DIR.mkdir(exist_ok=True)
+            tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp, 'wb') as f:
+                pickle.dump({'version': PARSER_VERSION, 'hash': digest, 'data': data}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            print(f"⚠️  Could not cache parse of {Path(csv_path).name}: {e}")
+    return data
+
+
+class PnLMatrix:
+    """
+    The parsed P&L as a dense month x account NumPy array: column j holds tree node j's rolled-up
+    amounts, rows follow data['months']. Label and month indexes map names to positions. Margins,
+    running totals, rolling windows, month-over-month deltas and the expense breakdown are then
+    computed for every month in a few vectorized passes. Needs numpy.
+    """
+
+    def __init__(self, data):
+        tree = data['tree']
+        self.months = list(data['months'])
+        self.month_index = {m: i for i, m in enumerate(self.months)}
+        self.years = [period_year(m) for m in self.months]
+        self.labels = tree.labels
+        self.label_index = defaultdict(list)  # lowercased label -> columns
+        for j, label in enumerate(tree.labels):
+            self.label_index[label.lower()].append(j)
+        self.values = np.frombuffer(tree.rollup(), dtype=np.float64).reshape(len(tree), len(self.months)).T.copy()
+        self.revenue = np.array([data['revenue_by_month'][m] for m in self.months], dtype=np.float64)
+        self.expenses = np.array([data['expenses_by_month'][m] for m in self.months], dtype=np.float64)
+
+        # Top-level expense accounts, duplicate labels merged into one column
+        expenses_node = tree.find('Expenses', AccountTree.ROOT)
+        columns = [c for c in tree.children(expenses_node[0]) if tree.kind[c] == AccountTree.ACCOUNT] if expenses_node else []
+        self.expense_labels = list(dict.fromkeys(tree.labels[c] for c in columns))
+        expense_index = {label: k for k, label in enumerate(self.expense_labels)}
+        group = np.zeros((len(columns), len(self.expense_labels)))
+        group[np.arange(len(columns)), [expense_index[tree.labels[c]] for c in columns]] = 1
+        self.expense_matrix = self.values[:, columns] @ group  # month x expense account
+
+    def column(self, label):
+        """Amounts per month for every account with this label, added together."""
+        return self.values[:, self.label_index.get(label.lower(), [])].sum(axis=1)
+
+    def breakdown(self, month):
+        """Top-level expense account -> amount for one month, same as AccountTree.breakdown minus the zeros."""
+        row = self.expense_matrix[self.month_index[month]].round(2)
+        return {label: float(v) for label, v in zip(self.expense_labels, row) if v > 0}
+
+    @staticmethod
+    def rolling_sum(values, window):
+        """Trailing sums over `window` months; NaN until there are enough months."""
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        out = np.full(len(values), np.nan)
+        if len(values) >= window:
+            out[window - 1:] = csum[window:] - csum[:-window]
+        return out
+
+    def year_to_date(self, values):
+        """Running totals that restart at the first month of each calendar year."""
+        csum = np.cumsum(values)
+        starts = np.array([i == 0 or year != self.years[i - 1] for i, year in enumerate(self.years)])
+        first = np.maximum.accumulate(np.where(starts, np.arange(len(values)), 0))
+        return csum - (csum - values)[first]
+
+    def ytd_totals(self, month):
+        """(revenue, expenses, net income) year to date through `month`, like ytd_totals()."""
+        i = self.month_index[month]
+        revenue = float(self.year_to_date(self.revenue)[i])
+        expenses = float(self.year_to_date(self.expenses)[i])
+        return revenue, expenses, revenue - expenses
+
+    @staticmethod
+    def ratio(numerator, denominator, fill=0.0):
+        """numerator / denominator where the denominator is positive, `fill` elsewhere (NaN included)."""
+        out = np.full(np.broadcast(numerator, denominator).shape, fill)
+        np.divide(numerator, denominator, out=out, where=denominator > 0)
+        return out
+
+    def analytics(self):
+        """Per-month vectors, each aligned with self.months."""
+        revenue, expenses = self.revenue, self.expenses
+        net = revenue - expenses
+        contract_labor = self.expense_matrix[:, self.expense_labels.index('Contract labor')] \
+            if 'Contract labor' in self.expense_labels else np.zeros(len(self.months))
+        result = {
+            'revenue': revenue,
+            'expenses': expenses,
+            'net_income': net,
+            'margin': self.ratio(net, revenue) * 100,
+            'ytd_revenue': self.year_to_date(revenue),
+            'ytd_expenses': self.year_to_date(expenses),
+            'ytd_net_income': self.year_to_date(net),
+            'revenue_mom': np.concatenate(([np.nan], np.diff(revenue))),
+            'expenses_mom': np.concatenate(([np.nan], np.diff(expenses))),
+            'contract_labor': contract_labor,
+            'contract_labor_ratio': self.ratio(contract_labor, revenue),
+        }
+        result['ytd_margin'] = self.ratio(result['ytd_net_income'], result['ytd_revenue']) * 100
+        for window in (3, 12):
+            rev_sum = self.rolling_sum(revenue, window)
+            result[f'revenue_avg_{window}m'] = rev_sum / window
+            # NaN (None in trends()) until the window is full, or when it has no revenue
+            result[f'margin_{window}m'] = self.ratio(rev_sum - self.rolling_sum(expenses, window), rev_sum, np.nan) * 100
+            result[f'contract_labor_ratio_{window}m'] = self.ratio(self.rolling_sum(contract_labor, window), rev_sum, np.nan)
+        return result
+
+    def trends(self):
+        """month -> trend figures for the dashboard (JSON-ready; missing windows are None)."""
+        a = self.analytics()
+        keys = ('ytd_revenue', 'ytd_net_income', 'ytd_margin', 'revenue_mom', 'expenses_mom',
+                'revenue_avg_3m', 'margin_3m', 'margin_12m', 'contract_labor_ratio_3m')
+        table = np.column_stack([a[k] for k in keys]).round(4)
+        return {month: {k: (None if np.isnan(v) else float(v)) for k, v in zip(keys, row)}
+                for month, row in zip(self.months, table)}
+
+
+def ytd_totals(data, month, matrix=None):
+    """(revenue, expenses, net income) from the first month of `month`'s calendar year through `month`.
+    Read from the matrix when there is one, so the dashboard and its JSON share one YTD calculation."""
+    if matrix is not None:
+        return matrix.ytd_totals(month)
+    year = period_year(month)
+    months = data['months'][:data['months'].index(month) + 1]
+    months = [m for m in months if period_year(m) == year]
+    revenue = sum(data['revenue_by_month'][m] for m in months)
+    expenses = sum(data['expenses_by_month'][m] for m in months)
+    return revenue, expenses, revenue - expenses
+
+
+def generate_dashboard(data, month=None, trends=None, matrix=None):
     if month is None:
         month = data['months'][-1]
 
@@ -197,11 +617,20 @@ def generate_dashboard(data, month=None):
     net_income = revenue - expenses
     margin = (net_income / revenue * 100) if revenue > 0 else 0
 
-    expense_breakdown = {}
-    for category, month_vals in data['expense_detail'].items():
-        val = month_vals.get(month, 0)
-        if val > 0:
-            expense_breakdown[category] = val
+    # Top-level expense accounts with their sub-accounts rolled in; falls back to the flat
+    # per-label detail for exports without an Expenses heading
+    tree = data.get('tree')
+    expenses_node = tree.find('Expenses', AccountTree.ROOT) if tree else []
+    if matrix is not None and expenses_node:
+        expense_breakdown = matrix.breakdown(month)
+    elif expenses_node:
+        expense_breakdown = {k: v for k, v in tree.breakdown(expenses_node[0], month).items() if v > 0}
+    else:
+        expense_breakdown = {}
+        for category, month_vals in data['expense_detail'].items():
+            val = month_vals.get(month, 0)
+            if val > 0:
+                expense_breakdown[category] = val
 
     lines = []
     lines.append("")
@@ -265,19 +694,43 @@ def generate_dashboard(data, month=None):
         lines.append("")
         lines.append("📈 YEAR-TO-DATE")
         lines.append("-" * 45)
-        lines.append(f"  YTD Revenue:          ${data['total_revenue']:>12,.0f}")
-        lines.append(f"  YTD Expenses:         ${data['total_expenses']:>12,.0f}")
-        lines.append(f"  YTD Net Income:       ${data['total_net_income']:>12,.0f}")
-        ytd_margin = (data['total_net_income'] / data['total_revenue'] * 100) if data['total_revenue'] > 0 else 0
+        ytd_revenue, ytd_expenses, ytd_net_income = ytd_totals(data, month, matrix)
+        lines.append(f"  YTD Revenue:          ${ytd_revenue:>12,.0f}")
+        lines.append(f"  YTD Expenses:         ${ytd_expenses:>12,.0f}")
+        lines.append(f"  YTD Net Income:       ${ytd_net_income:>12,.0f}")
+        ytd_margin = (ytd_net_income / ytd_revenue * 100) if ytd_revenue > 0 else 0
         lines.append(f"  YTD Margin:           {ytd_margin:>12.1f}%")
 
+    if trends:
+        lines.append("")
+        lines.append("📉 TRENDS")
+        lines.append("-" * 45)
+        if trends['revenue_mom'] is not None:
+            lines.append(f"  Revenue vs last month: {trends['revenue_mom']:>+11,.0f}")
+        if trends['revenue_avg_3m'] is not None:
+            lines.append(f"  3-month avg revenue:  ${trends['revenue_avg_3m']:>12,.0f}")
+        if trends['margin_3m'] is not None:
+            lines.append(f"  3-month margin:       {trends['margin_3m']:>12.1f}%")
+        if trends['contract_labor_ratio_3m'] is not None:
+            lines.append(f"  3-month contract labor: {trends['contract_labor_ratio_3m'] * 100:>10.1f}% of revenue")
+        if trends['margin_12m'] is not None:
+            lines.append(f"  12-month margin:      {trends['margin_12m']:>12.1f}%")
+
+    mismatches = [mm for mm in tree.verify() if mm[1] == month] if tree else []
+    if mismatches:
+        lines.append("")
+        lines.append("⚠️  SUBTOTAL CHECK")
+        lines.append("-" * 45)
+        for path, _, computed, reported in mismatches:
+            lines.append(f"  {path[:28]:<28} accounts ${computed:,.2f} vs total ${reported:,.2f}")
+
     lines.append("")
     lines.append("=" * 60)
     lines.append(f"  Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     lines.append("=" * 60)
     lines.append("")
 
-    return "\n".join(lines), {
+    month_data = {
         'month': month,
         'revenue': revenue,
         'expenses': expenses,
@@ -285,15 +738,147 @@ def generate_dashboard(data, month=None):
         'margin': margin,
         'expense_breakdown': expense_breakdown
     }
+    if trends:
+        month_data['trends'] = trends
+    return "\n".join(lines), month_data
+
+
+def make_matrix(data):
+    """PnLMatrix for the export, or None without numpy or an account tree."""
+    return PnLMatrix(data) if np is not None and data.get('tree') else None
+
+
+def month_trends(data, matrix=None):
+    """month -> trend figures for a multi-month export, or {} (single period, or no numpy)."""
+    if np is None or data['is_single_period'] or len(data['months']) < 2:
+        return {}
+    return (matrix or PnLMatrix(data)).trends()
+
+
+def generate_all_dashboards(data, matrix=None):
+    """[(text, month_data), ...] for every month in the export, sharing one pass of the analytics."""
+    matrix = matrix or make_matrix(data)
+    trends = month_trends(data, matrix)
+    return [generate_dashboard(data, month, trends.get(month), matrix) for month in data['months']]
+
+
+def report_stem(month):
+    return month.replace(' ', '_').replace(',', '').replace('-', '_')
+
+
+def report_json(data, month_data, matrix=None):
+    ytd_revenue, ytd_expenses, ytd_net_income = ytd_totals(data, month_data['month'], matrix)
+    return {
+        'generated': datetime.now().isoformat(),
+        **month_data,
+        'ytd_revenue': ytd_revenue,
+        'ytd_expenses': ytd_expenses,
+        'ytd_net_income': ytd_net_income
+    }
+
+
+def save_report(dashboard_text, payload):
+    """Write reports/dashboard_<month>.txt and data_<month>.json; returns both paths."""
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    month_str = report_stem(payload['month'])
+
+    report_file = OUTPUT_DIR / f"dashboard_{month_str}.txt"
+    with open(report_file, 'w') as f:
+        f.write(dashboard_text)
+
+    json_file = OUTPUT_DIR / f"data_{month_str}.json"
+    with open(json_file, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return report_file, json_file
+
+
+def find_batch_csvs(patterns):
+    """CSV paths for --all: each pattern is a directory, a file or a glob. Defaults to data/ and this folder."""
+    if not patterns:
+        return sorted(set(DATA_DIR.glob("*.csv")) | set(SCRIPT_DIR.glob("*.csv")))
+    paths = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(path.glob("*.csv"))
+        elif path.is_file():
+            paths.add(path)
+        else:
+            paths.update(Path(p) for p in glob.glob(pattern, recursive=True) if p.lower().endswith('.csv'))
+    return sorted(paths)
+
+
+def render_csv(csv_path, use_cache=True):
+    """Parse one export and render every month in it. Runs in a worker process, so it returns plain data:
+    (path, mtime, [(text, json payload), ...], error). A file that can't be parsed or rendered gets an
+    empty list and the reason, so one bad export doesn't abort the rest of the batch."""
+    try:
+        data = load_pnl(csv_path, use_cache)
+        if not data:
+            return csv_path, 0, [], None
+        matrix = make_matrix(data)
+        return csv_path, csv_path.stat().st_mtime, [
+            (text, report_json(data, month_data, matrix)) for text, month_data in generate_all_dashboards(data, matrix)], None
+    except Exception as e:
+        return csv_path, 0, [], f"{type(e).__name__}: {e}"
+
+
+def run_batch(patterns, jobs=None, use_cache=True):
+    """--all: parse every matching export in parallel and write one report per period. When several files
+    cover the same period, the most recently modified export wins."""
+    csvs = find_batch_csvs(patterns)
+    if not csvs:
+        print("❌ No CSV files found!")
+        return 1
+
+    workers = min(len(csvs), jobs or os.cpu_count() or 1)
+    print(f"📂 Processing {len(csvs)} file(s) with {workers} worker(s)")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_csv, csvs, [use_cache] * len(csvs)))
+    else:
+        results = [render_csv(path, use_cache) for path in csvs]
+
+    periods = {}  # period -> (mtime, path, text, payload)
+    superseded = 0
+    for path, mtime, reports, error in results:
+        if not reports:
+            print(f"⚠️  Could not parse {path.name}" + (f" ({error})" if error else ""))
+        for text, payload in reports:
+            period = payload['month']
+            if period in periods:
+                superseded += 1
+                if (mtime, path.name) < periods[period][:2]:
+                    continue
+            periods[period] = (mtime, path.name, text, payload)
+
+    for period, (_, name, text, payload) in periods.items():
+        save_report(text, payload)
+        print(f"  {period:<28} ← {name}")
+    print(f"\n📄 {len(periods)} period(s) written to {OUTPUT_DIR}/"
+          + (f" ({superseded} older duplicate(s) skipped)" if superseded else ""))
+    return 0
 
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='MVR Digital dashboard from a QuickBooks P&L export')
+    parser.add_argument('csv', nargs='?', help='CSV to process (default: most recent in data/)')
+    parser.add_argument('--all', nargs='*', metavar='PATH',
+                        help='Render every month of every CSV in these directories/files/globs (default: data/)')
+    parser.add_argument('--jobs', type=int, help='Worker processes for --all (default: one per core)')
+    parser.add_argument('--no-cache', action='store_true', help='Re-parse exports instead of using .cache/')
+    args = parser.parse_args()
+
     print("\n🔄 MVR Digital Dashboard Generator\n")
 
-    if len(sys.argv) > 1 and not sys.argv[1].startswith('--'):
-        csv_path = Path(sys.argv[1])
+    if args.all is not None:
+        sys.exit(run_batch(args.all + ([args.csv] if args.csv else []), args.jobs, not args.no_cache))
+
+    if args.csv:
+        csv_path = Path(args.csv)
         if not csv_path.exists():
-            csv_path = DATA_DIR / sys.argv[1]
+            csv_path = DATA_DIR / args.csv
     else:
         csv_path = find_latest_csv()
 
@@ -304,30 +889,17 @@ def main():
 
     print(f"📂 Processing: {csv_path.name}")
 
-    data = parse_qbo_pnl(csv_path)
+    data = load_pnl(csv_path, not args.no_cache)
     if not data:
         print("❌ Could not parse CSV")
         sys.exit(1)
 
-    dashboard_text, month_data = generate_dashboard(data)
+    month = data['months'][-1]
+    matrix = make_matrix(data)
+    dashboard_text, month_data = generate_dashboard(data, month, month_trends(data, matrix).get(month), matrix)
     print(dashboard_text)
 
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    month_str = month_data['month'].replace(' ', '_').replace(',', '').replace('-', '_')
-
-    report_file = OUTPUT_DIR / f"dashboard_{month_str}.txt"
-    with open(report_file, 'w') as f:
-        f.write(dashboard_text)
-
-    json_file = OUTPUT_DIR / f"data_{month_str}.json"
-    with open(json_file, 'w') as f:
-        json.dump({
-            'generated': datetime.now().isoformat(),
-            **month_data,
-            'ytd_revenue': data['total_revenue'],
-            'ytd_expenses': data['total_expenses'],
-            'ytd_net_income': data['total_net_income']
-        }, f, indent=2)
+    report_file, json_file = save_report(dashboard_text, report_json(data, month_data, matrix))
 
     print(f"📄 Report saved: {report_file}")
     print(f"📊 Data saved: {json_file}")
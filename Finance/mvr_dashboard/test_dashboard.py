@@ -0,0 +1,71 @@
+"""Tests for the P&L account tree: parent adoption on "Total for" rows and subtotal verification."""
+
+from pathlib import Path
+
+from dashboard import AccountTree, parse_qbo_pnl
+
+MONTHS = ['January 2025', 'February 2025']
+
+
+def build(rows):
+    tree = AccountTree(MONTHS)
+    for label, values in rows:
+        tree.add_row(label, values or [0.0] * len(MONTHS), values is None)
+    tree.finish()
+    return tree
+
+
+def expenses_rows(expenses_total):
+    # Two "Advertising" rows, as in real exports: only the second has sub-accounts
+    return [
+        ('Expenses', None),
+        ('Advertising', [10.0, 10.0]),
+        ('Software', [5.0, 5.0]),
+        ('Advertising', [100.0, 200.0]),
+        ('Google Ads', [30.0, 40.0]),
+        ('Meta Ads', [20.0, 60.0]),
+        ('Total for Advertising', [150.0, 300.0]),
+        ('Insurance', [7.0, 7.0]),
+        ('Total for Expenses', expenses_total),
+        ('Net Operating Income', [-172.0, -322.0]),
+    ]
+
+
+def test_total_row_adopts_the_matching_duplicate():
+    tree = build(expenses_rows([172.0, 322.0]))
+    expenses = tree.find('Expenses', AccountTree.ROOT)[0]
+    first, second = tree.find('Advertising')
+
+    assert tree.parent[first] == expenses
+    assert [tree.labels[c] for c in tree.children(second)] == ['Google Ads', 'Meta Ads']
+    assert tree.total(second) == [150.0, 300.0]
+    # Insurance comes after the total row, so it's a sibling again, not a sub-account
+    assert tree.parent[tree.find('Insurance')[0]] == expenses
+    assert tree.breakdown(expenses, 'February 2025') == {'Advertising': 310.0, 'Software': 5.0, 'Insurance': 7.0}
+    assert tree.total(expenses) == [172.0, 322.0]
+    # Summary lines sit at the top level and stay out of the rollups
+    assert tree.parent[tree.find('Net Operating Income')[0]] == AccountTree.ROOT
+    assert tree.verify() == []
+
+
+def test_verify_reports_subtotals_that_disagree():
+    tree = build(expenses_rows([172.0, 330.0]))
+    assert tree.verify() == [('Expenses', 'February 2025', 322.0, 330.0)]
+
+
+def test_total_without_a_match_falls_back_to_the_first_candidate():
+    tree = build([
+        ('Expenses', None),
+        ('Rent', [50.0, 50.0]),
+        ('Storage', [5.0, 5.0]),
+        ('Total for Rent', [60.0, 60.0]),
+        ('Total for Expenses', [55.0, 55.0]),
+    ])
+    rent = tree.find('Rent')[0]
+    assert [tree.labels[c] for c in tree.children(rent)] == ['Storage']
+    assert tree.verify() == [('Expenses > Rent', 'January 2025', 55.0, 60.0), ('Expenses > Rent', 'February 2025', 55.0, 60.0)]
+
+
+def test_sample_export_subtotals_add_up():
+    data = parse_qbo_pnl(Path(__file__).parent / 'data' / 'PnL_2025.csv')
+    assert data['tree'].verify() == []
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the weekly Foreplay -> Slack run, fully offline.
+
+Runs foreplay_slack_automation.main() against foreplay_fake_server.py (Foreplay + Slack stand-in)
+for each brand-list size x latency profile, twice: a cold run (empty dedup store and brand cache)
+and a warm run on the state the cold run left behind. Reports wall time, request count, credits,
+peak Python memory and a per-phase time split as JSON, so results can be diffed between releases.
+Phase times come from the run report's spans and are summed across scan workers, so with
+SCAN_CONCURRENCY > 1 they can exceed wall time.
+
+USAGE:
+    python3 benchmark_weekly_run.py                          # all scenarios, JSON to stdout
+    python3 benchmark_weekly_run.py --sizes small --latency none lan
+    python3 benchmark_weekly_run.py --output bench.json
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+os.environ.setdefault('FOREPLAY_API_KEY', 'benchmark')
+os.environ.setdefault('SLACK_WEBHOOK_URL', 'http://127.0.0.1:9/unused')
+
+import foreplay_slack_automation as fsa
+from foreplay_fake_server import FakeForeplayServer, synthetic_fixtures
+
+# name -> (tracked brands, ads per brand)
+SIZES = {
+    'small': (10, 10),
+    'medium': (32, 50),
+    'large': (200, 200),
+}
+# name -> (latency ms, jitter ms)
+LATENCY = {
+    'none': (0, 0),
+    'lan': (5, 2),
+    'wan': (60, 25),
+}
+
+
+# Run-report span -> benchmark phase
+PHASES = {
+    'request /api/discovery/brands': 'brand_search',
+    'request /api/spyder/brand/ads': 'ad_fetch',
+    'rate_limit_wait': 'rate_limit_wait',
+    'filter': 'filtering',
+    'slack_render': 'slack_render',
+    'slack_post': 'slack_http',
+    'dedup_save': 'dedup_save',
+}
+
+
+# Module settings run_once overrides; run_scenario restores them afterwards
+SETTINGS = ('TRACKED_BRANDS', 'POSTED_ADS_FILE', 'LEGACY_POSTED_ADS_FILE', 'DEDUP_BLOOM_FILE', 'BRAND_CACHE_FILE',
+            'AD_CACHE_FILE', 'RUN_CHECKPOINT_FILE', 'FOREPLAY_BASE_URL', 'SLACK_WEBHOOK_URL', 'SLACK_BOT_TOKEN',
+            'SLACK_CHANNEL', 'SLACK_API_BASE', 'DIGEST_CHANNELS_FILE', 'FOREPLAY_RECORD_FILE', 'RUN_REPORT_FILE')
+
+
+def run_once(server, state_dir):
+    """One in-process main() against the fake server. Returns the measurements."""
+    server.reset_stats()
+    credits_before = server.credits
+
+    # Every file the run reads or writes lives in state_dir, so the working tree's state never leaks in
+    fsa.POSTED_ADS_FILE = state_dir / 'posted_ads.db'
+    fsa.LEGACY_POSTED_ADS_FILE = state_dir / 'posted_ads.json'
+    fsa.DEDUP_BLOOM_FILE = state_dir / 'posted_ads.bloom'
+    fsa.BRAND_CACHE_FILE = state_dir / 'brand_cache.json'
+    fsa.AD_CACHE_FILE = state_dir / 'ad_cache.db'
+    fsa.RUN_CHECKPOINT_FILE = state_dir / 'run_checkpoint.json'
+    fsa.FOREPLAY_BASE_URL = server.url
+    fsa.SLACK_WEBHOOK_URL = f"{server.url}/slack/webhook"
+    # Nothing from the environment may reach a real destination: no bot token (so the webhook
+    # above is used), no fan-out channels, no fixture recording, no run report file
+    fsa.SLACK_BOT_TOKEN = fsa.SLACK_CHANNEL = None
+    fsa.SLACK_API_BASE = f"{server.url}/api"
+    fsa.DIGEST_CHANNELS_FILE = fsa.FOREPLAY_RECORD_FILE = fsa.RUN_REPORT_FILE = None
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        code = fsa.main([])
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    spans = fsa.METRICS.report()['spans']
+    stats = dict(server.stats)
+    return {
+        'exit_code': code,
+        'wall_s': round(wall, 4),
+        'requests': stats.get('requests', 0),
+        'brand_searches': stats.get('/api/discovery/brands', 0),
+        'ad_fetches': stats.get('/api/spyder/brand/ads', 0),
+        'slack_posts': stats.get('/slack/webhook', 0),
+        'credits': credits_before - server.credits,
+        'peak_mem_kb': round(peak / 1024, 1),
+        'phases_s': {phase: round(spans[name]['total_ms'] / 1000, 4) for name, phase in PHASES.items() if name in spans},
+        'request_latency_ms': {phase: {'p50': spans[name]['p50_ms'], 'p95': spans[name]['p95_ms']}
+                       for name, phase in PHASES.items() if name.startswith('request ') and name in spans},
+    }
+
+
+def run_scenario(size, latency, seed):
+    n_brands, ads_per_brand = SIZES[size]
+    latency_ms, jitter_ms = LATENCY[latency]
+    brands = [f"Bench Brand {i:04d}" for i in range(n_brands)]
+    fixtures = synthetic_fixtures(brands, ads_per_brand=ads_per_brand, seed=seed)
+
+    saved = {name: getattr(fsa, name) for name in SETTINGS}
+    fsa.TRACKED_BRANDS = brands
+    fsa.random.seed(seed)
+    try:
+        with FakeForeplayServer(fixtures, latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed) as server, \
+                tempfile.TemporaryDirectory() as tmp:
+            state_dir = Path(tmp)
+            cold = run_once(server, state_dir)
+            warm = run_once(server, state_dir)
+    finally:
+        for name, value in saved.items():
+            setattr(fsa, name, value)
+
+    return {'scenario': f"{size}/{latency}", 'brands': n_brands, 'ads_per_brand': ads_per_brand,
+            'latency_ms': latency_ms, 'cold': cold, 'warm': warm}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Offline benchmark of the weekly Foreplay -> Slack run')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--latency', nargs='+', choices=list(LATENCY), default=list(LATENCY))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for latency in args.latency:
+            print(f"Running {size}/{latency}...", file=sys.stderr)
+            results.append(run_scenario(size, latency, args.seed))
+
+    report = {
+        'generated': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'settings': {'scan_concurrency': fsa.SCAN_CONCURRENCY, 'api_max_rate': fsa.API_MAX_RATE,
+                     'api_fetch_limit': fsa.API_FETCH_LIMIT, 'scan_max_pages': fsa.SCAN_MAX_PAGES},
+        'results': results,
+    }
+    out = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(out)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
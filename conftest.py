@@ -0,0 +1,2 @@
+# test_foreplay_api.py is a manual connectivity check against the live API (run it directly)
+collect_ignore = ['test_foreplay_api.py']
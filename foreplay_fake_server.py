@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the Foreplay API (and Slack) for benchmarking and regression runs.
+
+Serves /api/discovery/brands and /api/spyder/brand/ads from a fixtures file (as written by
+FOREPLAY_RECORD_FILE on a real run) or from synthetic data, with configurable latency, error
+injection and X-Credits-Remaining / X-Credit-Cost headers. No credits are spent. Also accepts
+Slack incoming-webhook posts (/slack/webhook) and chat.postMessage calls (/api/chat.postMessage).
+
+USAGE:
+    python3 foreplay_fake_server.py                                # synthetic ads for TRACKED_BRANDS
+    python3 foreplay_fake_server.py --fixtures fixtures.json       # replay a recorded run
+    python3 foreplay_fake_server.py --latency-ms 80 --error-rate 0.05 --credits 500
+
+    # then, in another shell:
+    FOREPLAY_BASE_URL=http://127.0.0.1:8765 FOREPLAY_API_KEY=fake \\
+    SLACK_WEBHOOK_URL=http://127.0.0.1:8765/slack/webhook python3 foreplay_slack_automation.py
+    # or the Web API backend:
+    #   SLACK_API_BASE=http://127.0.0.1:8765/api SLACK_BOT_TOKEN=xoxb-fake SLACK_CHANNEL=C0FAKE
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from collections import Counter
+
+DEFAULT_BRANDS = [
+    'AG1', 'ARMRA', 'Auri Nutrition', 'BOOM Beauty', 'CarMax', 'Carvana', 'Curology', 'Dossier', 'Eadem',
+    'fatty15', 'hims', 'ILIA Beauty', 'IM8', 'Jones Road Beauty', 'Lumin', 'MAËLYS Cosmetics',
+    'Magic Spoon Cereal', "MaryRuth's", 'Mejuri', 'MUD\\WTR', 'Nood', 'Peddle', 'Prose', 'Pura Vida',
+    'Qure Skincare', 'rhode', 'Ritual', 'Seed', 'Shibumi Shade', 'SKIMS', 'True Classic', 'YETI'
+]
+SLACK_MAX_BLOCKS = 50
+MEDIA_HOST = 'https://media.fake.invalid'  # Synthetic media URLs; rewritten to this server's /media route when served
+FORMATS = ['video', 'image', 'carousel', 'dco']
+
+
+def synthetic_fixtures(brands=None, ads_per_brand=20, days=30, seed=42, active_ratio=0.6):
+    """
+    Fixture data shaped like Foreplay's responses. Only `active_ratio` of the brands have run
+    ads inside the last week; the rest only have older ones, like a real quiet brand.
+    """
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    day = 86400000
+    fixtures = {'brands': [], 'ads': {}}
+    for i, name in enumerate(brands or DEFAULT_BRANDS):
+        brand_id = f"fake-brand-{i:04d}"
+        fixtures['brands'].append({'id': brand_id, 'name': name})
+        active = rng.random() < active_ratio
+        ads = []
+        for j in range(ads_per_brand):
+            age = rng.uniform(0, days) if active else rng.uniform(8, days + 8)
+            fmt = rng.choice(FORMATS)
+            ad = {
+                'id': f"{brand_id}-ad-{j:05d}",
+                'name': f"{name} ad {j}",
+                'display_format': fmt,
+                'started_running': now_ms - int(age * day),
+                'countries': rng.choice([['US'], ['US', 'CA'], ['GB'], []]),
+                'headline': f"{name} headline {j}" if rng.random() < 0.8 else '',
+                'description': f"Copy for {name} ad {j}. " * rng.randint(1, 12),
+                'cta_title': rng.choice(['Shop Now', 'Learn More', '']),
+                'publisher_platform': ['facebook', 'instagram'],
+            }
+            if fmt != 'dco':
+                ad['thumbnail'] = f"{MEDIA_HOST}/{brand_id}/{j}.jpg"
+            if fmt == 'video':
+                ad['video'] = f"{MEDIA_HOST}/{brand_id}/{j}.mp4"
+            ads.append(ad)
+        ads.sort(key=lambda a: a['started_running'], reverse=True)
+        fixtures['ads'][brand_id] = ads
+    return fixtures
+
+
+class FakeForeplayServer:
+    """
+    Threaded local server. Use start()/stop() (or `with`) in-process, or run this file directly.
+    `stats` counts requests per path and credits charged. Synthetic media URLs are served from /media.
+    """
+
+    def __init__(self, fixtures=None, port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 credits=100000, ad_credit_cost=1, search_credit_cost=1, seed=None, expired_media_rate=0.0):
+        self.fixtures = fixtures or synthetic_fixtures()
+        self.expired_media_rate = expired_media_rate  # Fraction of /media URLs answering 403, like an expired CDN link
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate = error_rate
+        self.credits = credits
+        self.ad_credit_cost, self.search_credit_cost = ad_credit_cost, search_credit_cost
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.slack_messages = []  # Payloads accepted on either Slack route (chat.postMessage ones carry 'ts')
+        self.slack_ts = 0
+        self.ads_by_brand = self.fixtures.get('ads', {})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+            self.slack_messages.clear()
+
+    # --- request handling -------------------------------------------------
+
+    def _charge(self, cost):
+        with self.lock:
+            self.credits = max(0, self.credits - cost)
+            self.stats['credits_used'] += cost
+            return self.credits
+
+    def _search_brands(self, query, limit):
+        q = (query or '').lower()
+        exact = [b for b in self.fixtures.get('brands', []) if b['name'].lower() == q]
+        partial = [b for b in self.fixtures.get('brands', []) if q in b['name'].lower() and b not in exact]
+        return (exact + partial)[:limit]
+
+    def _brand_ads(self, params):
+        ads = self.ads_by_brand.get(params.get('brand_id'))
+        if ads is None:
+            return None, None
+        start_date = params.get('start_date')
+        if start_date:
+            try:
+                since = time.mktime(time.strptime(start_date, '%Y-%m-%d')) * 1000 - 86400000  # timezone slack
+                ads = [ad for ad in ads if (ad.get('started_running') or 0) >= since]
+            except ValueError:
+                pass
+        if params.get('order') == 'oldest':
+            ads = ads[::-1]
+        offset = int(params.get('cursor') or params.get('offset') or 0)
+        limit = int(params.get('limit') or 10)
+        page = ads[offset:offset + limit]
+        cursor = str(offset + limit) if offset + limit < len(ads) else None
+        return page, cursor
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                payload = body if isinstance(body, bytes) else json.dumps(body).replace(MEDIA_HOST, f"{server.url}/media").encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json' if not isinstance(body, bytes) else 'text/plain')
+                self.send_header('Content-Length', str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _delay(self):
+                delay = server.latency_ms + (server.rng.uniform(-server.jitter_ms, server.jitter_ms) if server.jitter_ms else 0)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+            def _inject_error(self):
+                if server.error_rate and server.rng.random() < server.error_rate:
+                    with server.lock:
+                        server.stats['errors_injected'] += 1
+                    if server.rng.random() < 0.5:
+                        self._send(429, {'error': 'rate limited'}, {'Retry-After': '0'})
+                    else:
+                        self._send(503, {'error': 'injected failure'})
+                    return True
+                return False
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.startswith('/media/'):
+                    with server.lock:
+                        server.stats['/media'] += 1
+                    return self._media(url.path, head=False)
+                with server.lock:
+                    server.stats[url.path] += 1
+                    server.stats['requests'] += 1
+                if url.path == '/_stats':
+                    return self._send(200, dict(server.stats, credits_remaining=server.credits))
+                self._delay()
+                if self._inject_error():
+                    return
+                if server.credits <= 0:
+                    return self._send(402, {'error': 'out of credits'})
+
+                if url.path == '/api/discovery/brands':
+                    brands = server._search_brands(params.get('query'), int(params.get('limit') or 10))
+                    remaining = server._charge(server.search_credit_cost)
+                    return self._send(200, {'data': brands, 'metadata': {'count': len(brands)}},
+                                      {'X-Credits-Remaining': remaining, 'X-Credit-Cost': server.search_credit_cost})
+
+                if url.path in ('/api/spyder/brand/ads', '/api/brand/getAdsByBrandId'):
+                    page, cursor = server._brand_ads(params)
+                    if page is None:
+                        return self._send(404, {'error': 'brand not found'})
+                    cost = max(1, len(page) * server.ad_credit_cost)
+                    remaining = server._charge(cost)
+                    return self._send(200, {'data': page, 'metadata': {'cursor': cursor, 'count': len(page)}},
+                                      {'X-Credits-Remaining': remaining, 'X-Credit-Cost': cost})
+
+                self._send(404, {'error': f'unknown endpoint {url.path}'})
+
+            def _media(self, path, head):
+                if (zlib.crc32(path.encode()) % 1000) < server.expired_media_rate * 1000:
+                    status, body = 403, b'expired'
+                    ctype = 'text/plain'
+                else:
+                    status, body = (206 if self.headers.get('Range') else 200), b'\xff\xd8\xff'
+                    ctype = 'video/mp4' if path.endswith('.mp4') else 'image/jpeg'
+                self.send_response(status)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def do_HEAD(self):
+                url = urlparse(self.path)
+                with server.lock:
+                    server.stats['/media' if url.path.startswith('/media/') else url.path] += 1
+                if url.path.startswith('/media/'):
+                    return self._media(url.path, head=True)
+                self.send_response(405)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with server.lock:
+                    server.stats[url.path] += 1
+                    server.stats['requests'] += 1
+                self._delay()
+                if url.path.startswith('/slack/webhook'):
+                    if self._inject_error():
+                        return
+                    try:
+                        payload = json.loads(body or b'{}')
+                    except ValueError:
+                        return self._send(400, b'invalid_payload')
+                    if len(payload.get('blocks', [])) > SLACK_MAX_BLOCKS:
+                        return self._send(400, b'invalid_blocks')
+                    with server.lock:
+                        server.slack_messages.append(payload)
+                    return self._send(200, b'ok')
+                if url.path == '/api/chat.postMessage':
+                    if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+                        return self._send(200, {'ok': False, 'error': 'not_authed'})
+                    if server.error_rate and server.rng.random() < server.error_rate:
+                        with server.lock:
+                            server.stats['errors_injected'] += 1
+                        return self._send(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': '0'})
+                    try:
+                        payload = json.loads(body or b'{}')
+                    except ValueError:
+                        return self._send(200, {'ok': False, 'error': 'invalid_json'})
+                    if not payload.get('channel'):
+                        return self._send(200, {'ok': False, 'error': 'channel_not_found'})
+                    if len(payload.get('blocks', [])) > SLACK_MAX_BLOCKS:
+                        return self._send(200, {'ok': False, 'error': 'invalid_blocks'})
+                    if payload.get('thread_ts') and not any(m.get('ts') == payload['thread_ts'] for m in server.slack_messages):
+                        return self._send(200, {'ok': False, 'error': 'thread_not_found'})
+                    with server.lock:
+                        server.slack_ts += 1
+                        payload['ts'] = f"{int(time.time())}.{server.slack_ts:06d}"
+                        server.slack_messages.append(payload)
+                    return self._send(200, {'ok': True, 'channel': payload['channel'], 'ts': payload['ts']})
+                self._send(404, {'error': f'unknown endpoint {url.path}'})
+
+        return Handler
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Local fake Foreplay API + Slack webhook')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='Fixtures JSON ({"brands": [...], "ads": {brand_id: [...]}}); synthetic if omitted')
+    parser.add_argument('--ads-per-brand', type=int, default=20, help='Synthetic ads per brand')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with 429/503')
+    parser.add_argument('--credits', type=int, default=100000, help='Starting X-Credits-Remaining balance')
+    parser.add_argument('--expired-media-rate', type=float, default=0, help='Fraction of media URLs answering 403')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = synthetic_fixtures(ads_per_brand=args.ads_per_brand, seed=args.seed)
+
+    server = FakeForeplayServer(fixtures, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                error_rate=args.error_rate, credits=args.credits, seed=args.seed,
+                                expired_media_rate=args.expired_media_rate)
+    print(f"Fake Foreplay API on {server.url} ({len(fixtures['brands'])} brands)")
+    print(f"  FOREPLAY_BASE_URL={server.url}")
+    print(f"  SLACK_WEBHOOK_URL={server.url}/slack/webhook")
+    print(f"  SLACK_API_BASE={server.url}/api")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStats: {dict(server.stats)}")
+
+
+if __name__ == '__main__':
+    main()
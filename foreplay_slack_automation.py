@@ -5,14 +5,28 @@ Only 3 ads per brand = ~15 credits per run (was 2,250!)
 Format: Brand → 2 ad links + 1 copy sample
 """
 
-import os, requests, json, time, random
+import os, requests, json, time, random, math, struct, hashlib, sqlite3, threading, zlib
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from string import Formatter
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Set
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Set, Callable, Iterable, Iterator
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 FOREPLAY_API_KEY = os.environ["FOREPLAY_API_KEY"]
-SLACK_WEBHOOK_URL = os.environ["SLACK_WEBHOOK_URL"]
-FOREPLAY_BASE_URL = 'https://public.api.foreplay.co'
+SLACK_WEBHOOK_URL = os.environ.get("SLACK_WEBHOOK_URL")
+SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")  # With SLACK_CHANNEL: post via chat.postMessage (threaded) instead of the webhook
+SLACK_CHANNEL = os.environ.get("SLACK_CHANNEL")
+SLACK_API_BASE = os.environ.get("SLACK_API_BASE", "https://slack.com/api")  # Point at foreplay_fake_server.py for offline runs
+FOREPLAY_BASE_URL = os.environ.get('FOREPLAY_BASE_URL', 'https://public.api.foreplay.co')  # Point at foreplay_fake_server.py for offline runs
+FOREPLAY_RECORD_FILE = os.environ.get('FOREPLAY_RECORD_FILE')  # Save this run's responses as replay fixtures
+RUN_REPORT_FILE = os.environ.get('RUN_REPORT_FILE')  # Also write the JSON run report here
+DIGEST_CHANNELS_FILE = os.environ.get('DIGEST_CHANNELS_FILE')  # Fan-out mode: per-channel brand lists (see README)
 
 TRACKED_BRANDS = [
     'AG1',
@@ -49,8 +63,46 @@ TRACKED_BRANDS = [
     'YETI'
 ]
 DAYS_LOOKBACK = 7
-POSTED_ADS_FILE = Path(__file__).parent / 'posted_ads.json'
+POSTED_ADS_FILE = Path(__file__).parent / 'posted_ads.db'
+LEGACY_POSTED_ADS_FILE = Path(__file__).parent / 'posted_ads.json'  # Imported into POSTED_ADS_FILE on first run
+DEDUP_BLOOM_FILE = Path(__file__).parent / 'posted_ads.bloom'
+DEDUP_BLOOM = os.environ.get('DEDUP_BLOOM', '0') == '1'  # Answer most is_posted() checks from a Bloom filter
+BLOOM_ERROR_RATE = 0.01
+DEDUP_RETENTION_DAYS = int(os.environ.get('DEDUP_RETENTION_DAYS', '365'))  # Forget posted IDs older than this
+AD_CACHE_FILE = Path(__file__).parent / 'ad_cache.db'
+AD_CACHE = os.environ.get('AD_CACHE', '1') == '1'  # Keep fetched ad payloads for --rerender/--repost and offline analysis
+AD_CACHE_MAX_MB = float(os.environ.get('AD_CACHE_MAX_MB', '50'))
+AD_CACHE_MAX_AGE_DAYS = int(os.environ.get('AD_CACHE_MAX_AGE_DAYS', '90'))
+BRAND_CACHE_FILE = Path(__file__).parent / 'brand_cache.json'
+RUN_CHECKPOINT_FILE = Path(__file__).parent / 'run_checkpoint.json'
+RUN_CHECKPOINT = os.environ.get('RUN_CHECKPOINT', '1') == '1'  # Resume an interrupted run instead of re-spending credits
+CHECKPOINT_MAX_AGE_HOURS = int(os.environ.get('CHECKPOINT_MAX_AGE_HOURS', '48'))  # Older checkpoints are discarded
+BRAND_SCHEDULER = os.environ.get('BRAND_SCHEDULER', '1') == '1'  # Order brands by past yield per credit instead of at random
+BRAND_STATS_DECAY = 0.8  # Weight kept by older scans each time a brand is scanned again
+BRAND_CACHE_TTL_DAYS = int(os.environ.get('BRAND_CACHE_TTL_DAYS', '30'))  # Re-search brand names after this long
 API_FETCH_LIMIT = 10  # Fetch 10 to ensure we find ads with visuals (skip DCO/text-only)
+SCAN_CONCURRENCY = int(os.environ.get('SCAN_CONCURRENCY', '4'))  # Brands scanned in parallel (1 = sequential)
+API_TIMEOUT = 30
+API_MAX_RETRIES = int(os.environ.get('API_MAX_RETRIES', '3'))  # Retries on timeouts, 429 and 5xx
+API_BACKOFF = float(os.environ.get('API_BACKOFF', '1.0'))  # Exponential backoff base in seconds (1s, 2s, 4s...)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+API_MAX_RATE = float(os.environ.get('API_MAX_RATE', '5'))  # Requests/sec when the credit budget is healthy
+API_MIN_RATE = 0.5  # Requests/sec when close to the credit floor
+CREDIT_FLOOR = int(os.environ.get('FOREPLAY_CREDIT_FLOOR', '100'))  # Stop cleanly before the balance drops below this
+CREDIT_COMFORT = int(os.environ.get('FOREPLAY_CREDIT_COMFORT', '2000'))  # Above floor + this, run at full speed/fetch size
+MIN_FETCH_LIMIT = 3
+SCAN_MAX_PAGES = int(os.environ.get('SCAN_MAX_PAGES', '1'))  # Pages of ads per brand in the weekly scan
+BACKFILL_PAGE_SIZE = 50
+SLACK_MAX_BLOCKS = 50  # Slack rejects messages with more blocks than this
+SLACK_MAX_PAYLOAD_BYTES = 40000  # Stay well under Slack's message size limit
+SLACK_POST_CONCURRENCY = int(os.environ.get('SLACK_POST_CONCURRENCY', '4'))  # Digest messages sent at once
+SLACK_MAX_RETRIES = 3
+VALIDATE_MEDIA = os.environ.get('VALIDATE_MEDIA', '1') == '1'  # Check media URLs before putting them in image blocks
+MEDIA_CHECK_CONCURRENCY = 8
+MEDIA_CHECK_TIMEOUT = 5
+MEDIA_CACHE_TTL = 600  # Seconds a good/bad verdict on a URL is reused
+ALLOWED_COUNTRIES = ('US', 'USA')
+REQUIRE_VISUALS = os.environ.get('REQUIRE_VISUALS', '0') == '1'  # Drop copy-only ads before they reach Slack
 
 # Weekly inspirational messages to energize designers
 INSPO_MESSAGES = [
@@ -71,247 +123,1704 @@ INSPO_MESSAGES = [
     "Warning: These ads might make you rethink everything. Proceed ✨"
 ]
 
+class Metrics:
+    """
+    Spans, counters and per-brand credit and scan-time totals for one run, reported as JSON at the end.
+    Thread-safe; the brand a scan worker is on is tracked per thread via brand_context().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.perf_counter()
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self.spans: Dict[str, List[float]] = {}  # name -> durations (ms)
+            self.counters = Counter()
+            self.credits_by_brand = Counter()
+            self.scan_ms_by_brand = Counter()
+            self.skip_reasons = Counter()
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def observe(self, name: str, ms: float):
+        with self.lock:
+            self.spans.setdefault(name, []).append(ms)
+
+    def incr(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def brand_context(self, brand: str):
+        self.local.brand = brand
+        try:
+            yield
+        finally:
+            self.local.brand = None
+
+    @contextmanager
+    def brand_scan(self, brand: str):
+        """brand_context() that also times the scan, both into the brand_scan span and per brand."""
+        start = time.perf_counter()
+        try:
+            with self.brand_context(brand):
+                yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.observe('brand_scan', ms)
+            with self.lock:
+                self.scan_ms_by_brand[brand] += ms
+
+    def current_brand(self):
+        return getattr(self.local, 'brand', None)
+
+    def brand_tag(self) -> str:
+        """"[brand] " inside brand_context(), so concurrent scans' log lines can be told apart; else ""."""
+        brand = self.current_brand()
+        return f"[{brand}] " if brand else ""
+
+    def add_credits(self, cost: float):
+        with self.lock:
+            self.credits_by_brand[self.current_brand() or '(none)'] += cost
+
+    def credits_for(self, brand: str) -> float:
+        with self.lock:
+            return self.credits_by_brand[brand]
+
+    def add_skips(self, pipeline):
+        with self.lock:
+            for stage in pipeline.stages:
+                if stage.rejected: self.skip_reasons[stage.label] += stage.rejected
+
+    @staticmethod
+    def _pct(sorted_vals: List[float], pct: float) -> float:
+        return sorted_vals[min(len(sorted_vals) - 1, max(0, math.ceil(pct / 100 * len(sorted_vals)) - 1))]
+
+    def report(self, **extra) -> Dict:
+        with self.lock:
+            spans = {}
+            for name, vals in sorted(self.spans.items()):
+                vals = sorted(vals)
+                spans[name] = {'count': len(vals), 'total_ms': round(sum(vals), 2), 'p50_ms': round(self._pct(vals, 50), 2),
+                               'p95_ms': round(self._pct(vals, 95), 2), 'max_ms': round(vals[-1], 2)}
+            return {
+                'started_at': self.started_at,
+                'wall_s': round(time.perf_counter() - self.started, 3),
+                'spans': spans,
+                'counters': dict(sorted(self.counters.items())),
+                'credits_by_brand': dict(self.credits_by_brand.most_common()),
+                'credits_total': sum(self.credits_by_brand.values()),
+                'scan_ms_by_brand': {b: round(ms, 2) for b, ms in self.scan_ms_by_brand.most_common()},
+                'skip_reasons': dict(self.skip_reasons.most_common()),
+                **extra,
+            }
+
+
+METRICS = Metrics()
+
+
+def brand_log(msg: str, brand: str = None):
+    """An indented log line tagged with the brand (default: the current brand_context()). Text and
+    newline go out in one write, so lines from concurrent scan workers don't run together."""
+    tag = f"[{brand}] " if brand else METRICS.brand_tag()
+    print(f"  {tag}{msg}\n", end='')
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter with double hashing, persisted as a small binary file.
+    `generation` identifies the table state it was built from (see DeduplicationStore).
+    """
+    MAGIC = b'FPBF2'
+    HEADER = struct.Struct('<5sQIQQQ')  # magic, bits, hashes, items added, capacity, generation
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.m = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+        self.generation = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path: Path):
+        try:
+            tmp = path.with_suffix(path.suffix + '.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.m, self.k, self.count, self.capacity, self.generation))
+                f.write(self.bits)
+            tmp.replace(path)
+        except OSError: pass
+
+    @classmethod
+    def load(cls, path: Path):
+        """The saved filter, or None if it is missing or unreadable."""
+        try:
+            with open(path, 'rb') as f:
+                magic, m, k, count, capacity, generation = cls.HEADER.unpack(f.read(cls.HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error): return None
+        if magic != cls.MAGIC or len(bits) != (m + 7) // 8: return None
+        bloom = cls.__new__(cls)
+        bloom.m, bloom.k, bloom.count, bloom.capacity, bloom.bits = m, k, count, capacity, bits
+        bloom.generation = generation
+        return bloom
+
+
 class DeduplicationStore:
-    def __init__(self, filepath: Path):
+    """
+    Posted ad IDs in an append-only SQLite table (posted_ads.db).
+    Membership is an indexed lookup, so nothing is loaded up front, and each run only
+    appends its new rows instead of rewriting the whole history. An existing
+    posted_ads.json is imported the first time the database is created.
+
+    With bloom_path set, a Bloom filter sits in front of the table: IDs it has never
+    seen (the common case - most fetched ads are new) are answered without touching SQLite.
+    Every write to `posted` stores a new random generation in the meta table; a saved filter
+    is only reused if it was built for the current one.
+    """
+
+    def __init__(self, filepath: Path, legacy_json: Path = LEGACY_POSTED_ADS_FILE, bloom_path: Path = None):
+        self.filepath = filepath
+        self.bloom_path = bloom_path
+        self.bloom = None
+        self.bloom_skips = 0  # is_posted() calls answered by the filter alone
+        self.lock = threading.Lock()
+        is_new = not filepath.exists()
+        self.conn = sqlite3.connect(str(filepath), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS posted (
+                ad_id TEXT PRIMARY KEY,
+                brand TEXT,
+                posted_at INTEGER NOT NULL  -- epoch seconds
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS watermarks (
+                brand TEXT PRIMARY KEY,
+                started_running INTEGER NOT NULL  -- epoch ms, newest ad posted for the brand
+            );
+            CREATE TABLE IF NOT EXISTS last_digest (  -- what the most recent digest posted, in order
+                ad_id TEXT NOT NULL,
+                brand TEXT,
+                posted_at INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        if is_new and legacy_json and legacy_json.exists():
+            self._import_json(legacy_json)
+        if bloom_path:
+            self._load_bloom()
+
+    def _load_bloom(self):
+        """
+        Use the saved filter if it was built from this exact table, otherwise rebuild it by streaming
+        the IDs. The filter comes from the Actions cache and the table from git, so the row count
+        alone can't tell them apart (a compaction can remove as many rows as a run added).
+        """
+        total = len(self)
+        generation = self._generation()
+        bloom = BloomFilter.load(self.bloom_path)
+        if bloom is None or bloom.count != total or bloom.generation != generation or total > bloom.capacity:
+            bloom = BloomFilter(max(10000, total * 2))
+            with self.lock:
+                for (ad_id,) in self.conn.execute("SELECT ad_id FROM posted"):
+                    bloom.add(ad_id)
+            bloom.generation = generation
+            bloom.save(self.bloom_path)
+        self.bloom = bloom
+
+    def _generation(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self) -> int:
+        """New random generation for the table; call inside the write's transaction."""
+        generation = int.from_bytes(os.urandom(7), 'little') + 1  # Fits SQLite's signed INTEGER, never 0
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (generation,))
+        return generation
+
+    def _import_json(self, path: Path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except: return
+        try:
+            posted_at = int(datetime.fromisoformat(data['last_updated']).timestamp())
+        except (KeyError, ValueError): posted_at = int(time.time())
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO posted (ad_id, brand, posted_at) VALUES (?, NULL, ?)",
+                                  ((ad_id, posted_at) for ad_id in data.get('posted_ad_ids', [])))
+            self.conn.executemany("INSERT OR REPLACE INTO watermarks VALUES (?, ?)", data.get('watermarks', {}).items())
+            self._bump_generation()
+        print(f"Dedup: imported {len(data.get('posted_ad_ids', []))} IDs from {path.name}")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM posted").fetchone()[0]
+
+    def is_posted(self, ad_id: str) -> bool:
+        if self.bloom is not None and ad_id not in self.bloom:
+            with self.lock:  # Called from the scan workers
+                self.bloom_skips += 1
+            return False  # Definitely never posted
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM posted WHERE ad_id = ?", (ad_id,)).fetchone() is not None
+
+    def watermark(self, brand: str):
+        """Newest started_running (epoch ms) posted for this brand, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT started_running FROM watermarks WHERE brand = ?", (brand,)).fetchone()
+        return row[0] if row else None
+
+    def mark_batch_posted(self, ad_ids: List[str], watermarks: Dict[str, int] = None, brand_of: Dict[str, str] = None,
+                          digest: bool = False):
+        """Record ads as posted. digest=True (only from the weekly run) also makes them the batch
+        last_batch() returns; backfills record history without replacing it."""
+        now = int(time.time())
+        brand_of = brand_of or {}
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO posted (ad_id, brand, posted_at) VALUES (?, ?, ?)",
+                                  ((ad_id, brand_of.get(ad_id), now) for ad_id in ad_ids))
+            generation = self._bump_generation()
+            if digest:
+                self.conn.execute("DELETE FROM last_digest")
+                self.conn.executemany("INSERT INTO last_digest (ad_id, brand, posted_at) VALUES (?, ?, ?)",
+                                      ((ad_id, brand_of.get(ad_id), now) for ad_id in ad_ids))
+            self.conn.executemany("""INSERT INTO watermarks VALUES (?, ?) ON CONFLICT(brand)
+                                     DO UPDATE SET started_running = MAX(started_running, excluded.started_running)""",
+                                  ((b, ts) for b, ts in (watermarks or {}).items() if ts))
+        if self.bloom is not None:
+            for ad_id in ad_ids:
+                self.bloom.add(ad_id)
+            self.bloom.count = len(self)  # Re-posted IDs were ignored by the table
+            self.bloom.generation = generation
+            if self.bloom.count > self.bloom.capacity:
+                self._load_bloom()  # Outgrown - resize before the false-positive rate climbs
+            else:
+                self.bloom.save(self.bloom_path)
+
+    def compact(self, max_age_days: int = DEDUP_RETENTION_DAYS) -> int:
+        """
+        Drop IDs posted more than max_age_days ago. Safe as long as that's well past DAYS_LOOKBACK:
+        those ads are too old to pass the date filter again anyway.
+        """
+        cutoff = int(time.time()) - max(max_age_days, DAYS_LOOKBACK * 2) * 86400
+        with self.lock:
+            with self.conn:
+                removed = self.conn.execute("DELETE FROM posted WHERE posted_at < ?", (cutoff,)).rowcount
+                if removed: self._bump_generation()
+            if removed:
+                self.conn.execute("VACUUM")
+        if removed and self.bloom is not None:
+            self._load_bloom()  # Can't delete from a Bloom filter - rebuild from what's left
+        return removed
+
+    def last_batch(self) -> Dict[str, List[str]]:
+        """brand -> ad IDs the last digest posted (the last mark_batch_posted(digest=True))."""
+        with self.lock:
+            rows = self.conn.execute("SELECT ad_id, brand FROM last_digest ORDER BY rowid").fetchall()
+        batch: Dict[str, List[str]] = {}
+        for ad_id, brand in rows:
+            batch.setdefault(brand or 'Unknown brand', []).append(ad_id)
+        return batch
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class AdCache:
+    """
+    Raw ad payloads as fetched, zlib-compressed in SQLite (ad_cache.db), keyed by ad ID and a hash
+    of the payload - an ad that changes between fetches keeps both versions. Lets a digest be
+    re-rendered or re-posted, and fetched ads be analysed offline, without spending credits again.
+    Entries older than max_age_days, then the oldest beyond max_mb, are evicted by evict().
+    """
+
+    def __init__(self, filepath: Path, max_mb: float = AD_CACHE_MAX_MB, max_age_days: int = AD_CACHE_MAX_AGE_DAYS):
+        self.filepath = filepath
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(filepath), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ads (
+                ad_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                brand_id TEXT,
+                fetched_at INTEGER NOT NULL,  -- epoch seconds, last time this version was seen
+                size INTEGER NOT NULL,  -- compressed bytes
+                payload BLOB NOT NULL,
+                PRIMARY KEY (ad_id, content_hash)
+            );
+            CREATE INDEX IF NOT EXISTS ads_fetched_at ON ads (fetched_at);
+        """)
+
+    def put_many(self, ads: List[Dict], brand_id: str = None):
+        now = int(time.time())
+        rows = []
+        for ad in ads:
+            if not ad.get('id'): continue
+            raw = json.dumps(ad, sort_keys=True).encode()
+            blob = zlib.compress(raw)
+            rows.append((ad['id'], hashlib.blake2b(raw, digest_size=16).hexdigest(), brand_id, now, len(blob), blob))
+        with self.lock, self.conn:
+            self.conn.executemany("""INSERT INTO ads VALUES (?, ?, ?, ?, ?, ?)
+                                     ON CONFLICT(ad_id, content_hash) DO UPDATE SET fetched_at = excluded.fetched_at""", rows)
+
+    def get(self, ad_id: str):
+        """Newest cached version of an ad, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT payload FROM ads WHERE ad_id = ? ORDER BY fetched_at DESC LIMIT 1",
+                                    (ad_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def iter_ads(self, brand_id: str = None, since: datetime = None) -> Iterator[Dict]:
+        """Every cached version, oldest fetch first, one payload decompressed at a time."""
+        query, params = "SELECT payload FROM ads WHERE fetched_at >= ?", [int(since.timestamp()) if since else 0]
+        if brand_id:
+            query += " AND brand_id = ?"
+            params.append(brand_id)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY fetched_at", params).fetchall()
+        for (blob,) in rows:
+            yield json.loads(zlib.decompress(blob))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            count, ads, size = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT ad_id), COALESCE(SUM(size), 0) FROM ads").fetchone()
+        return {'versions': count, 'ads': ads, 'bytes': size}
+
+    def evict(self) -> int:
+        """Drop versions past max_age, then the least recently fetched until under max_bytes. Returns rows removed."""
+        with self.lock:
+            with self.conn:
+                removed = self.conn.execute("DELETE FROM ads WHERE fetched_at < ?",
+                                            (int(time.time()) - self.max_age,)).rowcount
+                excess = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ads").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    doomed = []
+                    for ad_id, content_hash, size in self.conn.execute(
+                            "SELECT ad_id, content_hash, size FROM ads ORDER BY fetched_at"):
+                        if excess <= 0: break
+                        doomed.append((ad_id, content_hash))
+                        excess -= size
+                    self.conn.executemany("DELETE FROM ads WHERE ad_id = ? AND content_hash = ?", doomed)
+                    removed += len(doomed)
+            if removed:
+                self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class BrandCache:
+    """Brand name -> Foreplay brand_id, so warm runs skip /api/discovery/brands."""
+
+    def __init__(self, filepath: Path, ttl_days: int = BRAND_CACHE_TTL_DAYS):
         self.filepath = filepath
-        self.posted_ids: Set[str] = self._load()
+        self.ttl = timedelta(days=ttl_days)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = self._load()
+        self.dirty = False
 
-    def _load(self) -> Set[str]:
+    def _load(self) -> Dict[str, Dict]:
         if self.filepath.exists():
             try:
                 with open(self.filepath, 'r') as f:
-                    return set(json.load(f).get('posted_ad_ids', []))
-            except: return set()
-        return set()
+                    return json.load(f).get('brands', {})
+            except: return {}
+        return {}
 
-    def _save(self):
+    def save(self):
+        if not self.dirty and self.filepath.exists(): return
         try:
-            with open(self.filepath, 'w') as f:
-                json.dump({'posted_ad_ids': list(self.posted_ids), 'last_updated': datetime.now(timezone.utc).isoformat()}, f, indent=2)
+            with self.lock:
+                with open(self.filepath, 'w') as f:
+                    json.dump({'brands': self.entries, 'last_updated': datetime.now(timezone.utc).isoformat()}, f, indent=2, sort_keys=True)
+                self.dirty = False
         except: pass
 
-    def is_posted(self, ad_id: str) -> bool:
-        return ad_id in self.posted_ids
+    def get(self, brand: str):
+        """Cached {'id', 'name'} for a brand, or None if missing or past its TTL (forces revalidation)."""
+        with self.lock:
+            entry = self.entries.get(brand)
+        if not entry: return None
+        try:
+            resolved_at = datetime.fromisoformat(entry['resolved_at'])
+        except (KeyError, ValueError): return None
+        if datetime.now(timezone.utc) - resolved_at > self.ttl: return None
+        return entry
+
+    def put(self, brand: str, brand_id: str, name: str):
+        with self.lock:
+            self.entries[brand] = {'id': brand_id, 'name': name, 'resolved_at': datetime.now(timezone.utc).isoformat()}
+            self.dirty = True
+
+    def invalidate(self, brand: str = None):
+        """Drop one brand (e.g. its ID stopped working) or, with no argument, the whole cache."""
+        with self.lock:
+            if brand is None:
+                self.dirty = bool(self.entries)
+                self.entries.clear()
+            elif self.entries.pop(brand, None) is not None:
+                self.dirty = True
+
+
+class BrandScheduler:
+    """
+    Decides which brands to scan first, so brands that rarely publish stop costing as much as prolific
+    ones. Per-brand stats (scans, scans with new ads, new ads, credits, newest new ad) live in a
+    brand_stats table next to the posted IDs, decayed by BRAND_STATS_DECAY per scan so they follow
+    a brand's current pace. Brands are ordered by Thompson sampling: each draws a hit rate from
+    Beta(hits + 1, misses + 1), which is scaled by its new ads per hit and divided by its credits per scan.
+    Brands with few scans have wide draws and still come up early now and then.
+    """
+    PRIOR_ADS_PER_HIT = 2.0
+
+    def __init__(self, dedup: DeduplicationStore, decay: float = BRAND_STATS_DECAY):
+        self.conn, self.lock = dedup.conn, dedup.lock
+        self.decay = decay
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS brand_stats (
+                    brand TEXT PRIMARY KEY,
+                    scans REAL NOT NULL,
+                    hits REAL NOT NULL,  -- scans that found new ads
+                    new_ads REAL NOT NULL,
+                    credits REAL NOT NULL,
+                    last_new_ad INTEGER,  -- epoch ms, newest started_running among new ads
+                    last_scanned INTEGER NOT NULL  -- epoch seconds
+                )""")
+            self.stats = {row[0]: dict(zip(('scans', 'hits', 'new_ads', 'credits', 'last_new_ad', 'last_scanned'), row[1:]))
+                          for row in self.conn.execute("SELECT * FROM brand_stats")}
+        self.dirty = set()
+
+    def _cost_prior(self) -> float:
+        """Typical credits per scan across known brands, assumed for brands never scanned."""
+        costs = sorted(st['credits'] / st['scans'] for st in self.stats.values() if st['scans'] and st['credits'])
+        return costs[len(costs) // 2] if costs else 1.0
+
+    def score(self, brand: str, cost_prior: float) -> float:
+        st = self.stats.get(brand) or {'scans': 0, 'hits': 0, 'new_ads': 0, 'credits': 0}
+        hit_rate = random.betavariate(st['hits'] + 1, st['scans'] - st['hits'] + 1)
+        ads_per_hit = (st['new_ads'] + self.PRIOR_ADS_PER_HIT) / (st['hits'] + 1)
+        credits_per_scan = (st['credits'] + cost_prior) / (st['scans'] + 1)
+        return hit_rate * ads_per_hit / max(credits_per_scan, 0.01)
+
+    def order(self, brands: List[str]) -> List[str]:
+        cost_prior = self._cost_prior()
+        with self.lock:
+            scores = {brand: self.score(brand, cost_prior) for brand in brands}
+        return sorted(brands, key=scores.__getitem__, reverse=True)
+
+    def record(self, brand: str, new_ads: List[Dict], credits: float):
+        """Fold one completed scan into the brand's stats (saved by save())."""
+        newest = max((ad.get('started_running') or 0 for ad in new_ads), default=0) or None
+        with self.lock:
+            st = self.stats.get(brand) or {'scans': 0, 'hits': 0, 'new_ads': 0, 'credits': 0, 'last_new_ad': None}
+            self.stats[brand] = {
+                'scans': st['scans'] * self.decay + 1,
+                'hits': st['hits'] * self.decay + bool(new_ads),
+                'new_ads': st['new_ads'] * self.decay + len(new_ads),
+                'credits': st['credits'] * self.decay + credits,
+                'last_new_ad': max(filter(None, (st['last_new_ad'], newest)), default=None),
+                'last_scanned': int(time.time()),
+            }
+            self.dirty.add(brand)
+
+    def save(self):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO brand_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  ((b, *(self.stats[b][k] for k in ('scans', 'hits', 'new_ads', 'credits', 'last_new_ad', 'last_scanned')))
+                                   for b in self.dirty))
+            self.dirty.clear()
+
+    def report(self) -> str:
+        """Table of brands by new ads per credit, best first."""
+        rows = sorted(self.stats.items(), key=lambda kv: kv[1]['new_ads'] / max(kv[1]['credits'], 0.01), reverse=True)
+        lines = [f"{'Brand':<28} {'Scans':>6} {'Hit rate':>8} {'Ads/credit':>10}  Last new ad"]
+        for brand, st in rows:
+            last = datetime.fromtimestamp(st['last_new_ad'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d') if st['last_new_ad'] else '-'
+            lines.append(f"{brand[:28]:<28} {st['scans']:>6.1f} {st['hits'] / st['scans']:>8.0%} "
+                         f"{st['new_ads'] / max(st['credits'], 0.01):>10.2f}  {last}")
+        return '\n'.join(lines)
+
+
+class RunCheckpoint:
+    """
+    Progress of the current run in run_checkpoint.json, so a rerun after a crash or a failed Slack
+    post picks up where it stopped instead of repeating paid API calls. Records resolved brands,
+    each completed brand scan, the digests once the fetch phase is done, and which brands reached
+    each channel. Written atomically after every step. Discarded when it's older than
+    CHECKPOINT_MAX_AGE_HOURS or was made with different brands/channels, and deleted once the run completes.
+    """
+
+    def __init__(self, filepath: Path, fingerprint, brand_cache: BrandCache = None, max_age_hours: int = CHECKPOINT_MAX_AGE_HOURS):
+        self.filepath = filepath
+        self.brand_cache = brand_cache
+        self.lock = threading.Lock()
+        self.state = self._load(fingerprint, max_age_hours)
+        self.resumed = self.state is not None
+        if self.resumed:
+            if brand_cache:
+                for brand, entry in self.state['resolved'].items():
+                    if brand_cache.get(brand) is None:
+                        brand_cache.put(brand, entry['id'], entry['name'])
+        else:
+            self.state = {'fingerprint': fingerprint, 'started_at': datetime.now(timezone.utc).isoformat(),
+                          'phases': {}, 'resolved': {}, 'scans': {}, 'digests': None, 'delivered': {}}
+
+    def _load(self, fingerprint, max_age_hours: int):
+        if not self.filepath.exists(): return None
+        try:
+            with open(self.filepath, 'r') as f:
+                state = json.load(f)
+            age = datetime.now(timezone.utc) - datetime.fromisoformat(state['started_at'])
+        except (OSError, ValueError, KeyError): return None
+        if state.get('fingerprint') != fingerprint or age > timedelta(hours=max_age_hours):
+            print(f"Checkpoint: discarding {self.filepath.name} (stale or from a different brand/channel setup)")
+            return None
+        return state
+
+    @property
+    def scans(self) -> Dict[str, List[Dict]]:
+        return self.state['scans']
+
+    @property
+    def digests(self):
+        return self.state['digests']
+
+    def delivered(self, channel: int) -> Set[str]:
+        with self.lock:
+            return set(self.state['delivered'].get(str(channel), []))
+
+    def record_scan(self, brand: str, new_ads: List[Dict]):
+        with self.lock:
+            self.state['scans'][brand] = new_ads
+        self.save()
+
+    @property
+    def held_back(self) -> Dict[str, int]:
+        return self.state.get('held_back', {})
+
+    def finish_fetch(self, digests: List[Dict[str, List[Dict]]], held_back: Dict[str, int] = None):
+        with self.lock:
+            self.state['digests'] = digests
+            self.state['held_back'] = held_back or {}
+        self.set_phase('fetch', 'done')
+
+    def record_delivery(self, channel: int, brands: Iterable[str]):
+        with self.lock:
+            self.state['delivered'].setdefault(str(channel), []).extend(brands)
+        self.save()
+
+    def set_phase(self, phase: str, status: str):
+        with self.lock:
+            self.state['phases'][phase] = {'status': status, 'at': datetime.now(timezone.utc).isoformat()}
+        self.save()
+
+    def save(self):
+        with self.lock:
+            if self.brand_cache:
+                with self.brand_cache.lock:
+                    self.state['resolved'] = {b: dict(e) for b, e in self.brand_cache.entries.items()}
+            tmp = self.filepath.with_suffix('.tmp')
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(self.state, f)
+                os.replace(tmp, self.filepath)  # Never leave a half-written checkpoint behind
+            except OSError as e:
+                print(f"✗ Could not write checkpoint: {e}")
+
+    def clear(self):
+        with self.lock:
+            try:
+                self.filepath.unlink()
+            except FileNotFoundError: pass
+
+
+def make_session(pool_size: int = SCAN_CONCURRENCY, retries: int = API_MAX_RETRIES, backoff: float = API_BACKOFF) -> requests.Session:
+    """Keep-alive session with a connection pool sized for the scan workers.
+    Retries timeouts, 429 and 5xx with exponential backoff, honouring Retry-After."""
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUSES, allowed_methods=None, respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(1, pool_size), max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP-date), or None if absent or unreadable."""
+    if not value: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError: pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError): return None
+    if when.tzinfo is None: when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CreditLimiter:
+    """
+    Token bucket pacing requests, tuned by Foreplay's X-Credits-Remaining / X-Credit-Cost headers.
+    Full speed and full fetch size while the balance is comfortably above the floor; slows down and
+    fetches fewer ads as it gets close, and refuses requests that would cross the floor.
+    """
+
+    def __init__(self, max_rate: float = API_MAX_RATE, min_rate: float = API_MIN_RATE, floor: int = CREDIT_FLOOR,
+                 comfort: int = CREDIT_COMFORT, burst: int = SCAN_CONCURRENCY):
+        self.max_rate, self.min_rate = max_rate, min_rate
+        self.floor, self.comfort = floor, comfort
+        self.rate = max_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.remaining = None  # Unknown until the first response
+        self.costs: Dict[str, float] = {}  # endpoint -> last seen credit cost
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def _headroom_ratio(self) -> float:
+        if self.remaining is None: return 1.0
+        return max(0.0, min(1.0, (self.remaining - self.floor) / max(1, self.comfort)))
+
+    @property
+    def fetch_limit(self) -> int:
+        return max(MIN_FETCH_LIMIT, min(API_FETCH_LIMIT, round(API_FETCH_LIMIT * self._headroom_ratio())))
+
+    def acquire(self, endpoint: str) -> bool:
+        """Block until a token is available. False if this request would take the balance below the floor."""
+        while True:
+            with self.lock:
+                if self.remaining is not None and self.remaining - self.costs.get(endpoint, 1) < self.floor:
+                    self.exhausted = True
+                if self.exhausted: return False
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+    def update(self, endpoint: str, headers):
+        """Feed back credit headers from a response and re-tune the rate."""
+        try: remaining = int(float(headers.get('X-Credits-Remaining')))
+        except (TypeError, ValueError): remaining = None
+        try: cost = float(headers.get('X-Credit-Cost'))
+        except (TypeError, ValueError): cost = None
+        with self.lock:
+            if cost is not None: self.costs[endpoint] = cost
+            if remaining is None: return
+            # Concurrent responses can arrive out of order - the balance only goes down
+            self.remaining = remaining if self.remaining is None else min(self.remaining, remaining)
+            self.rate = self.min_rate + (self.max_rate - self.min_rate) * self._headroom_ratio()
+            if self.remaining <= self.floor: self.exhausted = True
+
+
+class FilterStage:
+    """One step of the ad filter pipeline: a predicate plus its own pass/reject counters and timing."""
+
+    def __init__(self, name: str, predicate: Callable[[Dict], bool], label: str = None,
+                 on_reject: Callable[[Dict], None] = None):
+        self.name = name
+        self.label = label or f"failed {name}"  # Shown in the "Filtered: ..." summary
+        self.predicate = predicate
+        self.on_reject = on_reject
+        self.passed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def __call__(self, ads: Iterable[Dict]) -> Iterator[Dict]:
+        for ad in ads:
+            start = time.perf_counter()
+            ok = self.predicate(ad)
+            self.seconds += time.perf_counter() - start
+            if ok:
+                self.passed += 1
+                yield ad
+            else:
+                self.rejected += 1
+                if self.on_reject: self.on_reject(ad)
+
+
+class AdPipeline:
+    """
+    Lazily chains FilterStages: each ad flows through the stages in order and stops at the
+    first rejection, so put cheap stages first. Ads can be fed in as pages arrive.
+    """
+
+    def __init__(self, stages: List[FilterStage]):
+        self.stages = stages
+
+    def run(self, ads: Iterable[Dict]) -> Iterator[Dict]:
+        stream = iter(ads)
+        for stage in self.stages:
+            stream = stage(stream)
+        return stream
+
+    def summary(self) -> str:
+        return ", ".join(f"{st.rejected} {st.label}" for st in self.stages)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {st.name: {'passed': st.passed, 'rejected': st.rejected, 'ms': round(st.seconds * 1000, 3)}
+                for st in self.stages}
+
+
+def recency_stage(since: datetime) -> FilterStage:
+    since_ms = since.timestamp() * 1000
+    return FilterStage('recency', lambda ad: bool(ad.get('started_running')) and ad['started_running'] >= since_ms, 'too old')
+
 
-    def mark_batch_posted(self, ad_ids: List[str]):
-        self.posted_ids.update(ad_ids)
-        self._save()
+def country_stage(allowed=ALLOWED_COUNTRIES) -> FilterStage:
+    def on_reject(ad):
+        brand_log(f"Skipped (non-US): {(ad.get('id') or '')[:8]}... countries={ad.get('countries')}")
+    # Ads without country data are kept
+    return FilterStage('country', lambda ad: not ad.get('countries') or any(c in ad['countries'] for c in allowed),
+                       'non-US', on_reject)
+
+
+def dedup_stage(dedup: 'DeduplicationStore') -> FilterStage:
+    return FilterStage('dedup', lambda ad: not dedup.is_posted(ad.get('id')), 'already posted')
+
+
+def has_visuals_stage() -> FilterStage:
+    return FilterStage('has_visuals', lambda ad: bool(ad.get('thumbnail') or ad.get('video') or ad.get('image')), 'no visuals')
+
+
+def predicate_stage(name: str, predicate: Callable[[Dict], bool], label: str = None) -> FilterStage:
+    """Wrap any ad -> bool function as a pipeline stage."""
+    return FilterStage(name, predicate, label)
+
+
+# One page from iter_brand_ads. `cursor` resumes after this page (None = last page); `error` is set on failure.
+AdPage = namedtuple('AdPage', ['ads', 'cursor', 'error'])
 
 
 class ForeplayAPI:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, brand_cache: BrandCache = None, session: requests.Session = None,
+                 limiter: CreditLimiter = None, extra_filters: List[Callable[[], FilterStage]] = None,
+                 record: bool = False, ad_cache: AdCache = None, scheduler: BrandScheduler = None):
         self.headers = {'Authorization': api_key}
+        self.scheduler = scheduler  # Scan order; random when None
+        self.ad_cache = ad_cache  # Every fetched page is kept here when set
+        self.recorded = {'brands': {}, 'ads': {}} if record else None  # Fixtures for foreplay_fake_server.py
+        self.extra_filters = extra_filters or []  # Stage factories appended after the built-in ones
+        self.brand_cache = brand_cache
+        self.limiter = limiter or CreditLimiter()
+        self.session = session or make_session()
+        self.session.headers.update(self.headers)
+        self.failures = Counter()  # "endpoint reason" -> count
+        self.scan_cache: Dict[str, List[Dict]] = None  # brand -> new ads; set to {} to share scans between digests
+        self.on_scan: Callable[[str, List[Dict]], None] = None  # Called with each complete, error-free scan
+        self.failed_scans: Set[str] = set()  # Brands whose scan hit a failed request this run
+        self.held_back: Dict[str, int] = {}  # Brand -> oldest started_running among new ads the 3-per-brand cap left out
+        self.halted = None  # Status (401/403/402) that makes every further request pointless; no more are sent
+        self.lock = threading.Lock()
 
-    def _request(self, endpoint: str, params: dict) -> dict:
+    def _fail(self, endpoint: str, reason, detail: str = '') -> dict:
+        METRICS.incr(f"failures {endpoint} {reason}")
+        with self.lock:
+            self.failures[f"{endpoint} {reason}"] += 1
+            if METRICS.current_brand(): self.failed_scans.add(METRICS.current_brand())
+        brand_log(f"✗ {endpoint} failed: {reason} {detail}".rstrip())
+        return {'data': [], 'error': reason}
+
+    def _request(self, endpoint: str, params: dict, quiet_404: bool = False) -> dict:
+        """GET an endpoint. On failure returns {'data': [], 'error': <status or reason>} and tallies it in self.failures.
+        quiet_404 returns a 404 untallied, for callers that can recover from it."""
+        if self.halted is not None:
+            return {'data': [], 'error': 'halted'}  # Already tallied once
+        with METRICS.span('rate_limit_wait'):
+            allowed = self.limiter.acquire(endpoint)
+        if not allowed:
+            return {'data': [], 'error': 'credit_floor'}  # Deliberate stop, not a failure
+        METRICS.incr(f"requests {endpoint}")
+        try:
+            with METRICS.span(f"request {endpoint}"):
+                r = self.session.get(f'{FOREPLAY_BASE_URL}{endpoint}', params=params, timeout=API_TIMEOUT)
+        except requests.exceptions.RetryError as e:
+            return self._fail(endpoint, 'retries_exhausted', str(e)[:120])
+        except requests.exceptions.Timeout:
+            return self._fail(endpoint, 'timeout')
+        except requests.exceptions.ConnectionError as e:
+            return self._fail(endpoint, 'connection_error', str(e)[:120])
+        except requests.exceptions.RequestException as e:
+            return self._fail(endpoint, 'request_error', str(e)[:120])
+
+        if r.status_code in (401, 403):
+            self.halted = r.status_code  # Every other brand would fail the same way - end the scan
+            return self._fail(endpoint, r.status_code, '(check FOREPLAY_API_KEY)')
+        if r.status_code == 402:
+            self.halted = r.status_code
+            return self._fail(endpoint, r.status_code, '(out of credits)')
+        if r.status_code == 404:
+            if quiet_404: return {'data': [], 'error': 404}
+            return self._fail(endpoint, r.status_code, '(not found)')
+        if r.status_code == 429 or r.status_code >= 500:
+            return self._fail(endpoint, r.status_code, f'(after {API_MAX_RETRIES} retries)')
+        if r.status_code >= 400:
+            return self._fail(endpoint, r.status_code, r.text[:120])
+
+        self.limiter.update(endpoint, r.headers)
+        try: METRICS.add_credits(float(r.headers.get('X-Credit-Cost')))
+        except (TypeError, ValueError): pass
+        brand_log(f"Credits: {r.headers.get('X-Credits-Remaining', '?')} | Cost: {r.headers.get('X-Credit-Cost', '?')}")
         try:
-            r = requests.get(f'{FOREPLAY_BASE_URL}{endpoint}', headers=self.headers, params=params, timeout=30)
-            r.raise_for_status()
-            print(f"Credits: {r.headers.get('X-Credits-Remaining', '?')} | Cost: {r.headers.get('X-Credit-Cost', '?')}")
             return r.json()
-        except: return {'data': []}
+        except ValueError:
+            return self._fail(endpoint, 'bad_json')
+
+    def save_recording(self, path: Path):
+        """Merge what this run fetched into a fixtures file that foreplay_fake_server.py can replay."""
+        if self.recorded is None: return
+        fixtures = {'brands': [], 'ads': {}}
+        if path.exists():
+            try:
+                with open(path, 'r') as f:
+                    fixtures = json.load(f)
+            except: pass
+        with self.lock:
+            brands = {b['id']: b for b in fixtures.get('brands', [])}
+            brands.update(self.recorded['brands'])
+            for brand_id, ads in self.recorded['ads'].items():
+                merged = {ad.get('id'): ad for ad in fixtures.get('ads', {}).get(brand_id, [])}
+                merged.update(ads)
+                fixtures.setdefault('ads', {})[brand_id] = sorted(merged.values(), key=lambda a: a.get('started_running') or 0, reverse=True)
+        fixtures['brands'] = list(brands.values())
+        with open(path, 'w') as f:
+            json.dump(fixtures, f)
+        print(f"Recorded fixtures: {path} ({len(fixtures['brands'])} brands)")
+
+    def failure_report(self) -> str:
+        with self.lock:
+            if not self.failures: return "API failures: none"
+            return "API failures: " + ", ".join(f"{k} x{v}" for k, v in sorted(self.failures.items()))
+
+    def resolve_brand(self, brand: str):
+        """Look up a brand's Foreplay ID, from the cache when possible. Returns {'id', 'name'} or None."""
+        with METRICS.span('brand_resolution'):
+            return self._resolve_brand(brand)
 
-    def get_recent_ads(self, brand_names: List[str], days_back: int, dedup: DeduplicationStore, target_brands: int = 5) -> Dict[str, List[Dict]]:
+    def _resolve_brand(self, brand: str):
+        if self.brand_cache:
+            cached = self.brand_cache.get(brand)
+            if cached:
+                METRICS.incr('brand_cache_hits')
+                brand_log(f"Cached: {cached['name']}", brand)
+                if self.recorded is not None:
+                    with self.lock:
+                        self.recorded['brands'][cached['id']] = {'id': cached['id'], 'name': cached['name']}
+                return cached  # carries 'resolved_at'; fresh lookups don't
+
+        brands = self._request('/api/discovery/brands', {'query': brand, 'limit': 1}).get('data', [])
+        if not brands: return None
+
+        brand_log(f"Found: {brands[0]['name']}", brand)
+        if self.recorded is not None:
+            with self.lock:
+                self.recorded['brands'][brands[0]['id']] = brands[0]
+        if self.brand_cache:
+            self.brand_cache.put(brand, brands[0]['id'], brands[0]['name'])
+        return {'id': brands[0]['id'], 'name': brands[0]['name']}
+
+    def iter_brand_ads(self, brand_id: str, since: datetime = None, page_size: int = None, cursor: str = None,
+                       max_pages: int = None, quiet_404: bool = False) -> Iterator[AdPage]:
+        """
+        Page through a brand's ads, newest first, one AdPage at a time (only one page is held in memory).
+        Stops after the last page, after max_pages, on an error, or once a page reaches ads older than `since`.
+        Pass a page's cursor back in to resume from where it left off. quiet_404 leaves a 404 on the
+        first page untallied (see _request), e.g. when the brand ID may just be stale.
         """
-        Randomly check brands until we have target_brands with new ads.
-        This saves credits by not checking all brands every time.
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            params = {'brand_id': brand_id, 'limit': page_size or self.limiter.fetch_limit, 'order': 'newest'}
+            if since: params['start_date'] = since.strftime('%Y-%m-%d')
+            if cursor: params['cursor'] = cursor
+            resp = self._request('/api/spyder/brand/ads', params, quiet_404=quiet_404 and pages == 0)
+            if resp.get('error') is not None:
+                yield AdPage([], cursor, resp['error'])
+                return
+            ads = resp.get('data', [])
+            cursor = (resp.get('metadata') or {}).get('cursor')
+            pages += 1
+            if self.recorded is not None:
+                with self.lock:
+                    self.recorded['ads'].setdefault(brand_id, {}).update((ad.get('id'), ad) for ad in ads)
+            if self.ad_cache is not None:
+                self.ad_cache.put_many(ads, brand_id)
+            yield AdPage(ads, cursor, None)
+            if not ads or not cursor: return
+            # Newest first: once the oldest ad on the page is past the cutoff, later pages are too
+            oldest = min((ad.get('started_running') or 0) for ad in ads)
+            if since and oldest < since.timestamp() * 1000: return
+
+    def build_pipeline(self, since: datetime, dedup: DeduplicationStore) -> AdPipeline:
+        """Per-brand filter pipeline, cheapest checks first: date and country are dict lookups, dedup hits the store."""
+        stages = [recency_stage(since), country_stage()]
+        if REQUIRE_VISUALS: stages.append(has_visuals_stage())
+        stages.append(dedup_stage(dedup))
+        stages.extend(make() for make in self.extra_filters)
+        return AdPipeline(stages)
+
+    def _scan_brand(self, brand: str, cutoff: datetime, dedup: DeduplicationStore, stop: threading.Event) -> List[Dict]:
+        """Search one brand and return its new ads (empty if nothing new or the scan was stopped)."""
+        if stop.is_set(): return []
+        if self.scan_cache is not None:
+            with self.lock:
+                cached = self.scan_cache.get(brand)
+            if cached is not None:
+                METRICS.incr('scan_cache_hits')
+                return list(cached)
+        credits_before = METRICS.credits_for(brand)
+        with METRICS.brand_scan(brand):
+            METRICS.incr('brands_scanned')
+            recent = self._scan_brand_ads(brand, cutoff, dedup, stop)
+        # A stopped or failed scan may have skipped its ads fetch, so only complete ones are reused or scored
+        if stop.is_set() or self.limiter.exhausted or self.halted is not None or brand in self.failed_scans: return recent
+        if self.scan_cache is not None:
+            with self.lock:
+                self.scan_cache[brand] = list(recent)
+        if self.on_scan is not None:
+            self.on_scan(brand, list(recent))
+        if self.scheduler is not None:
+            self.scheduler.record(brand, recent, METRICS.credits_for(brand) - credits_before)
+        return recent
+
+    def _scan_brand_ads(self, brand: str, cutoff: datetime, dedup: DeduplicationStore, stop: threading.Event) -> List[Dict]:
+        brand_log("Searching", brand)
+        resolved = self.resolve_brand(brand)
+        if not resolved: return []
+        brand_id = resolved['id']
+
+        # Target already hit by other workers - don't pay for ads we'd throw away
+        if stop.is_set(): return []
+
+        # Nothing older than the lookback or than what we last posted for this brand is new to us,
+        # so only ask for ads from there on - quiet brands come back (nearly) empty
+        since = cutoff
+        watermark = dedup.watermark(brand)
+        if watermark:
+            since = max(cutoff, datetime.fromtimestamp(watermark/1000, tz=timezone.utc))
+
+        # Only fetch a few ads to minimize credits!
+        from_cache = 'resolved_at' in resolved
+        pages = self.iter_brand_ads(brand_id, since, max_pages=SCAN_MAX_PAGES, quiet_404=from_cache)
+        first = next(pages, None)
+        if first and first.error == 404 and from_cache:
+            # ID came from the cache and has gone stale - re-resolve once. The 404 only counts
+            # as a failure if that doesn't work; the second fetch tallies its own errors.
+            METRICS.incr('brand_cache_stale')
+            self.brand_cache.invalidate(brand)
+            resolved = self.resolve_brand(brand)
+            if not resolved or resolved['id'] == brand_id:
+                self._fail('/api/spyder/brand/ads', 404, '(not found)')
+                return []
+            if stop.is_set(): return []
+            pages = self.iter_brand_ads(resolved['id'], since, max_pages=SCAN_MAX_PAGES)
+            first = next(pages, None)
+        if first is None: return []
+
+        retrieved = [0]
+        def stream():
+            # Ads flow into the pipeline as each page arrives
+            for page in chain([first], pages):
+                retrieved[0] += len(page.ads)
+                yield from page.ads
+                if stop.is_set(): return  # Don't pay for further pages
+
+        # start_date is day-granular, so the recency stage re-checks against the exact watermark
+        pipeline = self.build_pipeline(since, dedup)
+        recent = list(pipeline.run(stream()))
+        METRICS.observe('filter', sum(st.seconds for st in pipeline.stages) * 1000)
+        METRICS.add_skips(pipeline)
+        METRICS.incr('ads_retrieved', retrieved[0])
+        brand_log(f"Retrieved: {retrieved[0]} ads", brand)
+        brand_log(f"Filtered: {pipeline.summary()}", brand)
+        return recent
+
+    def get_recent_ads(self, brand_names: List[str], days_back: int, dedup: DeduplicationStore, target_brands: int = 5,
+                       concurrency: int = SCAN_CONCURRENCY) -> Dict[str, List[Dict]]:
+        """
+        Check brands until we have target_brands with new ads, best prospects first when a
+        scheduler is set (otherwise in random order). This saves credits by not checking all
+        brands every time.
+
+        Up to `concurrency` brands are scanned at once. As soon as the target is
+        reached, queued brands are cancelled and in-flight scans skip their ads fetch.
         """
         cutoff = datetime.now(timezone.utc) - timedelta(days=days_back)
         results = {}
 
-        # Randomize brand order
-        remaining_brands = brand_names.copy()
-        random.shuffle(remaining_brands)
+        if self.scheduler is not None:
+            remaining_brands = self.scheduler.order(brand_names)
+        else:
+            remaining_brands = brand_names.copy()
+            random.shuffle(remaining_brands)
 
         print(f"\nTarget: Find {target_brands} brands with new ads")
-        print(f"Total brands available: {len(remaining_brands)}")
-
-        while len(results) < target_brands and remaining_brands:
-            brand = remaining_brands.pop(0)
-            print(f"\nSearching: {brand}")
-            brands = self._request('/api/discovery/brands', {'query': brand, 'limit': 1}).get('data', [])
-            if not brands: continue
-            
-            brand_id = brands[0]['id']
-            print(f"  Found: {brands[0]['name']}")
-            
-            # Only fetch 3 ads to minimize credits!
-            ads = self._request('/api/spyder/brand/ads', {'brand_id': brand_id, 'limit': API_FETCH_LIMIT}).get('data', [])
-            print(f"  Retrieved: {len(ads)} ads")
-            
-            recent = []
-            skipped_dedup = 0
-            skipped_country = 0
-            skipped_date = 0
-
-            for ad in ads:
-                ad_id = ad.get('id')
-
-                # Check dedup
-                if dedup.is_posted(ad_id):
-                    skipped_dedup += 1
-                    continue
-
-                # Filter: USA only
-                countries = ad.get('countries', [])
-                if countries and 'US' not in countries and 'USA' not in countries:
-                    skipped_country += 1
-                    print(f"    Skipped (non-US): {ad_id[:8]}... countries={countries}")
-                    continue
-
-                # Check date
-                ts = ad.get('started_running')
-                if ts and datetime.fromtimestamp(ts/1000, tz=timezone.utc) >= cutoff:
-                    recent.append(ad)
-                else:
-                    skipped_date += 1
-
-            print(f"  Filtered: {skipped_dedup} already posted, {skipped_country} non-US, {skipped_date} too old")
-            
-            if recent:
-                recent.sort(key=lambda x: (bool(x.get('video')), x.get('started_running', 0)), reverse=True)
-                results[brand] = recent[:3]  # Max 3
-                print(f"  New ads: {len(results[brand])}")
-            
-            time.sleep(0.5)
-
-        print(f"\n🎯 Found {len(results)} brands with new ads (checked {len(brand_names) - len(remaining_brands)} total)")
+        print(f"Total brands available: {len(remaining_brands)} (scanning {max(1, concurrency)} at a time)")
+
+        stop = threading.Event()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            while len(results) < target_brands and (remaining_brands or in_flight):
+                # Keep the pool topped up (unless the credit floor has been hit)
+                while remaining_brands and len(in_flight) < max(1, concurrency) and not self.limiter.exhausted \
+                        and self.halted is None:
+                    brand = remaining_brands.pop(0)
+                    in_flight[pool.submit(self._scan_brand, brand, cutoff, dedup, stop)] = brand
+
+                if not in_flight: break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    brand = in_flight.pop(future)
+                    try:
+                        recent = future.result()
+                    except Exception as e:
+                        print(f"  [{brand}] Scan failed: {e}")
+                        continue
+                    if recent and len(results) < target_brands:
+                        recent.sort(key=lambda x: (bool(x.get('video')), x.get('started_running', 0)), reverse=True)
+                        results[brand] = recent[:3]  # Max 3
+                        if recent[3:]:
+                            # The watermark mustn't pass these, or they'd never be fetched again
+                            self.held_back[brand] = min(ad.get('started_running') or 0 for ad in recent[3:])
+                        print(f"  [{brand}] New ads: {len(results[brand])}")
+
+            # Target hit: stop in-flight workers before their ads fetch and drop anything still queued
+            stop.set()
+            for future in in_flight:
+                future.cancel()
+
+        checked = len(brand_names) - len(remaining_brands) - len(in_flight)
+        print(f"\n🎯 Found {len(results)} brands with new ads (checked {checked} total)")
+        if self.halted is not None:
+            print(f"⚠️  Stopped early: Foreplay answered {self.halted} - no further requests sent")
+        elif self.limiter.exhausted:
+            print(f"⚠️  Stopped early: credit balance ({self.limiter.remaining}) reached the floor of {self.limiter.floor}")
         return results
 
 
+class MediaValidator:
+    """
+    Checks ad media URLs before they go into Slack image blocks: an expired Foreplay CDN link
+    makes Slack reject the whole message. Each ad's candidates (thumbnail, then image) are tried
+    in order with a HEAD, falling back to a 1-byte ranged GET where HEAD isn't allowed.
+    The first one that answers with an image wins. Verdicts are cached for MEDIA_CACHE_TTL seconds.
+    Videos aren't candidates - they never come back as image/*, so checking them only costs a request.
+    """
+    CANDIDATES = ('thumbnail', 'image')
+
+    def __init__(self, session: requests.Session = None, ttl: float = MEDIA_CACHE_TTL):
+        self.session = session or make_session(MEDIA_CHECK_CONCURRENCY, retries=1)
+        self.ttl = ttl
+        self.cache: Dict[str, tuple] = {}  # url -> (ok, checked_at)
+        self.lock = threading.Lock()
+
+    def check(self, url: str) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            hit = self.cache.get(url)
+        if hit and now - hit[1] < self.ttl:
+            METRICS.incr('media_cache_hits')
+            return hit[0]
+        ok = False
+        try:
+            with METRICS.span('media_check'):
+                r = self.session.head(url, timeout=MEDIA_CHECK_TIMEOUT, allow_redirects=True)
+                if r.status_code in (403, 405, 501):  # Some CDNs refuse HEAD
+                    r = self.session.get(url, headers={'Range': 'bytes=0-0'}, timeout=MEDIA_CHECK_TIMEOUT, stream=True)
+                    r.close()
+            ok = r.status_code in (200, 206) and r.headers.get('Content-Type', '').startswith('image/')
+        except requests.exceptions.RequestException: pass
+        if not ok: METRICS.incr('media_bad_urls')
+        with self.lock:
+            self.cache[url] = (ok, now)
+        return ok
+
+    def pick(self, ad: Dict):
+        """First candidate URL for this ad that Slack can render, or None."""
+        for key in self.CANDIDATES:
+            url = ad.get(key)
+            if url and self.check(url):
+                return url
+        return None
+
+    def resolve(self, ads_by_brand: Dict[str, List[Dict]]) -> Dict[str, str]:
+        """ad id -> usable media URL (or None) for every ad, checked concurrently."""
+        ads = [ad for brand_ads in ads_by_brand.values() for ad in brand_ads]
+        with ThreadPoolExecutor(max_workers=MEDIA_CHECK_CONCURRENCY) as pool:
+            return dict(zip((ad.get('id') for ad in ads), pool.map(self.pick, ads)))
+
+
+class BlockTemplate:
+    """
+    A Slack block with {field} placeholders in its strings, parsed once up front.
+    render(**fields) builds a fresh block without re-parsing or nested literal construction.
+    """
+
+    def __init__(self, block):
+        self.block = block
+        self._fill = self._compile(block)
+
+    @classmethod
+    def _compile(cls, node):
+        if isinstance(node, str):
+            pieces = [(literal, field) for literal, field, _, _ in Formatter().parse(node)]
+            if all(field is None for _, field in pieces):
+                return lambda fields: node
+            return lambda fields: ''.join(literal + (str(fields[field]) if field is not None else '') for literal, field in pieces)
+        if isinstance(node, dict):
+            parts = [(key, cls._compile(value)) for key, value in node.items()]
+            return lambda fields: {key: fill(fields) for key, fill in parts}
+        if isinstance(node, list):
+            parts = [cls._compile(value) for value in node]
+            return lambda fields: [fill(fields) for fill in parts]
+        return lambda fields: node
+
+    def render(self, **fields) -> Dict:
+        return self._fill(fields)
+
+
+# Digest layout - edit here to change how the Slack post looks
+DIGEST_TEMPLATES = {
+    'header': {"type": "header", "text": {"type": "plain_text", "text": "✨ Creative Inspo of the Week"}},
+    'inspo': {"type": "section", "text": {"type": "mrkdwn", "text": "_{message}_"}},
+    'divider': {"type": "divider"},
+    'brand': {"type": "section", "text": {"type": "mrkdwn", "text": "*{brand}*"}},
+    'image': {"type": "image", "image_url": "{url}", "alt_text": "{brand} {fmt}"},
+    'video_link': {"type": "context", "elements": [{"type": "mrkdwn", "text": "<{video}|▶️ Watch Video> • _{fmt}_"}]},
+    'format': {"type": "context", "elements": [{"type": "mrkdwn", "text": "_{fmt}_"}]},
+    'copy': {"type": "section", "text": {"type": "mrkdwn", "text": "*Copy Sample:*\n{copy}"}},
+    'footer': {"type": "context", "elements": [{"type": "mrkdwn", "text": "_{total_ads} new ads from {total_brands} brands_"}]},
+}
+MAX_VISUALS_PER_BRAND = 2
+COPY_PREVIEW_CHARS = 180
+
+
+class DigestRenderer:
+    """
+    Renders digest blocks from DIGEST_TEMPLATES (compiled once), one pass over each brand's ads.
+    Render-only - no network - so many digests (per team, per category...) can be built cheaply.
+    """
+
+    def __init__(self, templates: Dict[str, Dict] = None):
+        self.t = {name: BlockTemplate(block) for name, block in (templates or DIGEST_TEMPLATES).items()}
+
+    @staticmethod
+    def _copy_text(ad: Dict) -> str:
+        headline = (ad.get('headline') or '').strip()
+        desc = (ad.get('description') or '').strip()
+        cta = (ad.get('cta_title') or '').strip()
+        if not headline and not desc: return ''
+        copy_text = ""
+        if headline: copy_text += f"_{headline}_\n"
+        if desc: copy_text += (desc[:COPY_PREVIEW_CHARS] + "..." if len(desc) > COPY_PREVIEW_CHARS else desc)
+        if cta: copy_text += f"\n*CTA:* {cta}"
+        return copy_text
+
+    def render_brand(self, brand: str, ads: List[Dict], media: Dict[str, str] = None) -> List[Dict]:
+        """
+        Blocks for one brand, or [] if it has nothing to show: up to 2 ads with visuals, then the
+        first ad's copy as a sample. `media` is ad id -> validated URL (None = use raw URLs).
+        """
+        t = self.t
+        visuals = []
+        shown = 0
+        has_visuals = has_copy = False
+        for ad in ads:
+            url = media.get(ad.get('id')) if media is not None else (ad.get('thumbnail') or ad.get('video') or ad.get('image'))
+            if url:
+                has_visuals = True
+                if shown < MAX_VISUALS_PER_BRAND:
+                    shown += 1
+                    fmt = ad.get('display_format', 'Ad')
+                    visuals.append(t['image'].render(url=url, brand=brand, fmt=fmt))
+                    video = ad.get('video')
+                    visuals.append(t['video_link'].render(video=video, fmt=fmt) if video else t['format'].render(fmt=fmt))
+            if not has_copy and ((ad.get('headline') or '').strip() or (ad.get('description') or '').strip()):
+                has_copy = True
+
+        if not has_visuals and not has_copy:
+            return []  # Skip brands with no displayable content
+
+        blocks = [t['divider'].render(), t['brand'].render(brand=brand), *visuals]
+        copy_text = self._copy_text(ads[0]) if ads else ''
+        if copy_text:
+            blocks.append(t['copy'].render(copy=copy_text))  # Only 1 copy sample per brand
+        return blocks
+
+    def render(self, ads_by_brand: Dict[str, List[Dict]], inspo_message: str = None, media: Dict[str, str] = None):
+        """(header blocks, [(brand, blocks), ...], footer blocks). Picks a random inspo message if none given."""
+        t = self.t
+        header = [t['header'].render(), t['inspo'].render(message=inspo_message or random.choice(INSPO_MESSAGES)),
+                  t['divider'].render()]
+        sections = [(brand, blocks) for brand, ads in sorted(ads_by_brand.items())
+                    if (blocks := self.render_brand(brand, ads, media))]
+        footer = [t['divider'].render(), t['footer'].render(
+            total_ads=sum(len(ads) for ads in ads_by_brand.values()), total_brands=len(ads_by_brand))]
+        return header, sections, footer
+
+    def render_messages(self, ads_by_brand: Dict[str, List[Dict]], inspo_message: str = None,
+                        media: Dict[str, str] = None) -> List[Dict]:
+        """Full digest as webhook-ready messages ({'blocks': [...], 'brands': [...]}), without posting."""
+        return SlackPoster.chunk_digest(*self.render(ads_by_brand, inspo_message, media))
+
+
 class SlackPoster:
-    def __init__(self, webhook: str):
+    """
+    Posts the digest through the incoming webhook. Slack rejects messages over 50 blocks, so the
+    digest is split into several messages along brand boundaries: the first (with the header) is
+    sent alone, the middle ones concurrently, and the last (with the footer) after them.
+    Each message is retried on its own, so one failure doesn't lose the whole digest.
+    """
+
+    def __init__(self, webhook: str, session: requests.Session = None, validator: MediaValidator = None):
         self.webhook = webhook
+        self.session = session or make_session(SLACK_POST_CONCURRENCY, retries=0)  # Retries are per chunk, below
+        self.validator = validator or (MediaValidator() if VALIDATE_MEDIA else None)
+        self.renderer = DIGEST_RENDERER
+        self.failed_brands: Set[str] = set()  # Brands whose message didn't make it (from the last post)
+
+    def resolve_media(self, ads_by_brand: Dict[str, List[Dict]]):
+        """ad id -> working media URL, or None when validation is off (raw URLs are used)."""
+        if not self.validator: return None
+        with METRICS.span('media_validation'):
+            return self.validator.resolve(ads_by_brand)
+
+    def build_digest(self, ads_by_brand: Dict[str, List[Dict]], media: Dict[str, str] = None):
+        """(header blocks, [(brand, blocks), ...], footer blocks) for the weekly digest."""
+        return self.renderer.render(ads_by_brand, media=media)
+
+    @staticmethod
+    def chunk_digest(header: List[Dict], sections: List, footer: List[Dict],
+                     max_blocks: int = SLACK_MAX_BLOCKS, max_bytes: int = SLACK_MAX_PAYLOAD_BYTES) -> List[Dict]:
+        """
+        Pack header + brand sections + footer into as few messages as fit Slack's limits, never
+        splitting a brand across messages. Returns [{'blocks': [...], 'brands': [...]}, ...].
+        """
+        def size(blocks):
+            return len(json.dumps(blocks, ensure_ascii=False).encode())
+
+        chunks = [{'blocks': list(header), 'brands': []}]
+        for brand, blocks in sections + [(None, footer)]:
+            current = chunks[-1]
+            if (len(current['blocks']) + len(blocks) > max_blocks
+                    or size(current['blocks']) + size(blocks) > max_bytes) and current['blocks']:
+                current = {'blocks': [], 'brands': []}
+                chunks.append(current)
+            current['blocks'].extend(blocks[:max_blocks])  # A single brand never comes close; truncate defensively
+            if brand is not None: current['brands'].append(brand)
+        return chunks
+
+    def _attempt(self, blocks: List[Dict], **extra) -> requests.Response:
+        return self.session.post(self.webhook, json={"blocks": blocks}, timeout=30)
+
+    def _result(self, r: requests.Response):
+        """What a successful delivery returns (webhooks have no message ID), or None if Slack refused it."""
+        return True
+
+    def _send(self, blocks: List[Dict], **extra):
+        """
+        Deliver one message, retrying connection errors, 429 (honouring Retry-After) and 5xx.
+        Returns _result() of the response, or None if it couldn't be delivered.
+        """
+        for attempt in range(SLACK_MAX_RETRIES + 1):
+            try:
+                with METRICS.span('slack_post'):
+                    r = self._attempt(blocks, **extra)
+                if r.status_code < 400:
+                    return self._result(r)
+                if r.status_code != 429 and r.status_code < 500:
+                    print(f"\n✗ Slack rejected message: {r.status_code} {r.text[:120]}")
+                    return None  # Bad payload - retrying won't help
+                if r.status_code == 429: METRICS.incr('slack_rate_limited')
+                delay = parse_retry_after(r.headers.get('Retry-After'))
+                if delay is None: delay = API_BACKOFF * 2 ** attempt
+            except requests.exceptions.RequestException as e:
+                print(f"\n✗ Slack post error: {e}")
+                delay = API_BACKOFF * 2 ** attempt
+            if attempt < SLACK_MAX_RETRIES:
+                METRICS.incr('slack_retries')
+                time.sleep(delay)
+        return None
 
     def post_weekly_inspiration(self, ads_by_brand: Dict[str, List[Dict]]):
         """Simple format: Brand + visuals + copy sample"""
-        # Pick a random inspirational message
-        inspo_message = random.choice(INSPO_MESSAGES)
-
-        blocks = [
-            {"type": "header", "text": {"type": "plain_text", "text": "✨ Creative Inspo of the Week"}},
-            {"type": "section", "text": {"type": "mrkdwn", "text": f"_{inspo_message}_"}},
-            {"type": "divider"}
-        ]
-
-        for brand, ads in sorted(ads_by_brand.items()):
-            # Pre-check: Does this brand have anything to show?
-            has_visuals = any((ad.get('thumbnail') or ad.get('video') or ad.get('image')) for ad in ads)
-            has_copy = any(((ad.get('headline') or '').strip() or (ad.get('description') or '').strip()) for ad in ads)
-
-            if not has_visuals and not has_copy:
-                # Skip brands with no displayable content
-                continue
-
-            blocks.append({"type": "divider"})
-
-            # Brand header
-            blocks.append({
-                "type": "section",
-                "text": {"type": "mrkdwn", "text": f"*{brand}*"}
-            })
-
-            # Show up to 2 ads that have actual visuals (prioritize visual ads)
-            visuals_shown = 0
-            for ad in ads:
-                if visuals_shown >= 2:
-                    break
-
-                # Get media URLs
-                thumbnail = ad.get('thumbnail')
-                video = ad.get('video')
-                image = ad.get('image')
-                media = thumbnail or video or image
-
-                if not media:
-                    continue  # Skip ads without visuals
-
-                fmt = ad.get('display_format', 'Ad')
-
-                # Show thumbnail/image inline
-                blocks.append({
-                    "type": "image",
-                    "image_url": media,
-                    "alt_text": f"{brand} {fmt}"
-                })
-
-                # Add clickable link to video if available
-                if video:
-                    blocks.append({
-                        "type": "context",
-                        "elements": [{"type": "mrkdwn", "text": f"<{video}|▶️ Watch Video> • _{fmt}_"}]
-                    })
-                else:
-                    blocks.append({
-                        "type": "context",
-                        "elements": [{"type": "mrkdwn", "text": f"_{fmt}_"}]
-                    })
-
-                visuals_shown += 1
-
-            # Show copy sample if available
-            for ad in ads:
-                headline = (ad.get('headline') or '').strip()
-                desc = (ad.get('description') or '').strip()
-                cta = (ad.get('cta_title') or '').strip()
-
-                # Build copy text if available
-                if headline or desc:
-                    copy_text = ""
-                    if headline: copy_text += f"_{headline}_\n"
-                    if desc: copy_text += (desc[:180] + "..." if len(desc) > 180 else desc)
-                    if cta: copy_text += f"\n*CTA:* {cta}"
-
-                    blocks.append({
-                        "type": "section",
-                        "text": {"type": "mrkdwn", "text": f"*Copy Sample:*\n{copy_text}"}
-                    })
-
-                break  # Only 1 copy sample per brand
-
-        # Footer
+        media = self.resolve_media(ads_by_brand)
+        render_start = time.perf_counter()
+        chunks = self.chunk_digest(*self.build_digest(ads_by_brand, media))
+        METRICS.observe('slack_render', (time.perf_counter() - render_start) * 1000)
+
+        # Header first and footer last keep the digest readable; brand order in between doesn't matter
+        ok = [False] * len(chunks)
+        ok[0] = self._send(chunks[0]['blocks']) is not None
+        if len(chunks) > 2:
+            ok[1:-1] = self._send_all(chunks[1:-1])
+        if len(chunks) > 1:
+            ok[-1] = self._send(chunks[-1]['blocks']) is not None
+        return self._report(ads_by_brand, chunks, ok)
+
+    def _send_all(self, chunks: List[Dict], **extra) -> List[bool]:
+        """Send chunks concurrently; order of arrival isn't guaranteed."""
+        with ThreadPoolExecutor(max_workers=max(1, SLACK_POST_CONCURRENCY)) as pool:
+            return [r is not None for r in pool.map(lambda c: self._send(c['blocks'], **extra), chunks)]
+
+    def _report(self, ads_by_brand: Dict[str, List[Dict]], chunks: List[Dict], ok: List[bool]) -> bool:
+        self.failed_brands = {brand for chunk, sent in zip(chunks, ok) if not sent for brand in chunk['brands']}
         total_brands = len(ads_by_brand)
         total_ads = sum(len(ads) for ads in ads_by_brand.values())
-        blocks.append({"type": "divider"})
-        blocks.append({
-            "type": "context",
-            "elements": [{"type": "mrkdwn", "text": f"_{total_ads} new ads from {total_brands} brands_"}]
-        })
+        if all(ok):
+            print(f"\n✅ Posted! {total_brands} brands with {total_ads} ads ({len(chunks)} message{'s' if len(chunks) > 1 else ''})")
+            return True
+        print(f"\n✗ Failed: {ok.count(False)}/{len(chunks)} messages (brands: {', '.join(sorted(self.failed_brands)) or 'header/footer only'})")
+        return False
+
+
+DIGEST_RENDERER = DigestRenderer()
+
 
+class SlackWebAPIPoster(SlackPoster):
+    """
+    Posts through chat.postMessage with a bot token instead of the webhook: the header and
+    totals go out as one parent message, and brands are posted as replies in its thread,
+    packed several per reply up to Slack's limits and sent in order. Gets message IDs (ts) back and honours
+    Retry-After on 429s.
+    """
+
+    def __init__(self, token: str, channel: str, api_base: str = SLACK_API_BASE, session: requests.Session = None,
+                 validator: MediaValidator = None):
+        super().__init__(None, session, validator)
+        self.channel = channel
+        self.api_base = api_base.rstrip('/')
+        self.session.headers.update({'Authorization': f'Bearer {token}'})
+        self.thread_ts = None
+
+    def _attempt(self, blocks: List[Dict], thread_ts: str = None, text: str = 'Creative Inspo of the Week') -> requests.Response:
+        payload = {'channel': self.channel, 'blocks': blocks, 'text': text, 'unfurl_links': False, 'unfurl_media': False}
+        if thread_ts: payload['thread_ts'] = thread_ts
+        return self.session.post(f'{self.api_base}/chat.postMessage', json=payload, timeout=30)
+
+    def _result(self, r: requests.Response):
         try:
-            requests.post(self.webhook, json={"blocks": blocks}, timeout=30).raise_for_status()
-            print(f"\n✅ Posted! {total_brands} brands with {total_ads} ads")
-            return True
-        except Exception as e:
-            print(f"\n✗ Failed: {e}")
+            body = r.json()
+        except ValueError:
+            body = {}
+        if not body.get('ok'):
+            print(f"\n✗ chat.postMessage failed: {body.get('error', r.text[:120])}")
+            return None
+        return body.get('ts')
+
+    def post_weekly_inspiration(self, ads_by_brand: Dict[str, List[Dict]]):
+        media = self.resolve_media(ads_by_brand)
+        render_start = time.perf_counter()
+        header, sections, footer = self.build_digest(ads_by_brand, media)
+        replies = self.chunk_digest([], sections, [])
+        if not replies[-1]['blocks']: replies.pop()
+        METRICS.observe('slack_render', (time.perf_counter() - render_start) * 1000)
+
+        self.thread_ts = self._send(header[:-1] + footer[1:])  # Header + totals; the divider belongs to the thread
+        if not self.thread_ts:
+            self.failed_brands = set(ads_by_brand)
+            print("\n✗ Failed to post the weekly header - nothing posted")
             return False
+        # One at a time: Slack orders a thread by arrival, so concurrent replies would scramble the brands
+        ok = [self._send(reply['blocks'], thread_ts=self.thread_ts, text='Creative Inspo of the Week (continued)') is not None
+              for reply in replies]
+        return self._report(ads_by_brand, replies, ok)
+
+
+def backfill(api: ForeplayAPI, dedup: DeduplicationStore, brand: str, since: datetime = None, cursor: str = None) -> int:
+    """
+    Walk a brand's ad history page by page and record every ad as posted, e.g. when adding a new
+    brand (so old ads aren't posted) or rebuilding the dedup store. Prints a cursor after each page;
+    pass it back with --cursor to resume an interrupted backfill.
+    """
+    resolved = api.resolve_brand(brand)
+    if not resolved:
+        print(f"✗ Brand not found: {brand}")
+        return 1
+    total = 0
+    for page in api.iter_brand_ads(resolved['id'], since, page_size=BACKFILL_PAGE_SIZE, cursor=cursor):
+        if page.error is not None:
+            print(f"✗ Backfill stopped ({page.error}). Resume with: --cursor {page.cursor}" if page.cursor else f"✗ Backfill stopped ({page.error})")
+            return 1
+        ads = [ad for ad in page.ads if not since or (ad.get('started_running') or 0) >= since.timestamp() * 1000]
+        dedup.mark_batch_posted([ad['id'] for ad in ads],
+                                {brand: max((ad.get('started_running') or 0 for ad in ads), default=0)},
+                                {ad['id']: brand for ad in ads})
+        total += len(ads)
+        print(f"  {brand}: +{len(ads)} ads (total {total}) cursor={page.cursor}")
+    print(f"✅ Backfilled {total} ads for {brand}")
+    return 0
+
 
+def replay_last_digest(dedup: DeduplicationStore, ad_cache: AdCache, post: bool) -> int:
+    """
+    Rebuild the last posted digest from the ad cache without calling Foreplay, and print its Slack
+    messages as JSON (--rerender) or post it again (--repost). Nothing is marked as posted.
+    """
+    batch = dedup.last_batch()
+    if not batch:
+        print("✗ Nothing has been posted yet")
+        return 1
+    ads_by_brand, missing = {}, 0
+    for brand, ad_ids in batch.items():
+        ads = [ad for ad in map(ad_cache.get, ad_ids) if ad]
+        missing += len(ad_ids) - len(ads)
+        if ads:
+            ads_by_brand[brand] = sorted(ads, key=lambda x: (bool(x.get('video')), x.get('started_running', 0)), reverse=True)
+    if missing:
+        print(f"⚠️  {missing} posted ads are missing from {ad_cache.filepath.name} (fetched before it existed, or evicted)")
+    if not ads_by_brand:
+        return 1
+    if post:
+        return 0 if make_poster().post_weekly_inspiration(ads_by_brand) else 1
+    print(json.dumps(DIGEST_RENDERER.render_messages(ads_by_brand), indent=2))
+    return 0
+
+
+def emit_run_report(**extra):
+    """One greppable JSON line for the Actions log, plus RUN_REPORT_FILE if set."""
+    report = METRICS.report(**extra)
+    print(f"\nRUN_REPORT {json.dumps(report, sort_keys=True)}")
+    if RUN_REPORT_FILE:
+        try:
+            with open(RUN_REPORT_FILE, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        except OSError as e:
+            print(f"✗ Could not write run report: {e}")
+    return report
+
+
+def load_channels(path) -> List[Dict]:
+    """
+    Read the fan-out config: a JSON list of channels, each with a "name", its "brands" (defaults to
+    TRACKED_BRANDS), an optional "target_brands", and where to post - "webhook_url", "webhook_env"
+    (name of an env var holding the webhook, to keep secrets out of the file) or a bot "channel".
+    """
+    channels = json.loads(Path(path).read_text())
+    if not isinstance(channels, list) or not channels:
+        raise ValueError("expected a non-empty JSON list of channels")
+    for i, channel in enumerate(channels):
+        channel.setdefault('name', f"channel {i + 1}")
+        channel.setdefault('brands', TRACKED_BRANDS)
+        if channel.get('webhook_env'):
+            channel['webhook_url'] = os.environ.get(channel['webhook_env'])
+        if not channel.get('webhook_url') and not (channel.get('channel') and SLACK_BOT_TOKEN):
+            raise ValueError(f"{channel['name']}: needs webhook_url, a set webhook_env, or channel with SLACK_BOT_TOKEN")
+    return channels
+
+
+def make_poster(channel: Dict = None, validator: MediaValidator = None) -> SlackPoster:
+    """Web API poster (threaded) when a bot token and channel are configured, otherwise the webhook."""
+    if channel is not None:
+        if channel.get('channel') and SLACK_BOT_TOKEN:
+            return SlackWebAPIPoster(SLACK_BOT_TOKEN, channel['channel'], SLACK_API_BASE, validator=validator)
+        return SlackPoster(channel['webhook_url'], validator=validator)
+    if SLACK_BOT_TOKEN and SLACK_CHANNEL:
+        return SlackWebAPIPoster(SLACK_BOT_TOKEN, SLACK_CHANNEL, SLACK_API_BASE, validator=validator)
+    return SlackPoster(SLACK_WEBHOOK_URL, validator=validator)
+
+
+def post_digests(channels: List[Dict], digests: List[Dict[str, List[Dict]]],
+                 checkpoint: RunCheckpoint = None) -> Dict[str, List[Dict]]:
+    """
+    Post each channel's digest concurrently (channel None = the single configured destination).
+    Brands the checkpoint already has as delivered to a channel aren't posted there again.
+    Returns the ads that reached at least one channel, by brand.
+    """
+    validator = MediaValidator() if VALIDATE_MEDIA else None  # Shared, so a URL is checked once across channels
+
+    def post(i, channel, ads_by_brand):
+        done = checkpoint.delivered(i) if checkpoint else set()
+        sent = {brand: ads for brand, ads in ads_by_brand.items() if brand in done}
+        pending = {brand: ads for brand, ads in ads_by_brand.items() if brand not in done}
+        if not pending: return sent
+        if channel is not None:
+            print(f"\n→ {channel['name']}: {len(pending)} brands")
+        if done:
+            print(f"Checkpoint: {len(done)} brands already posted{' to ' + channel['name'] if channel else ''}")
+        slack = make_poster(channel, validator)
+        slack.post_weekly_inspiration(pending)
+        delivered = {brand: ads for brand, ads in pending.items() if brand not in slack.failed_brands}
+        if checkpoint: checkpoint.record_delivery(i, delivered)
+        return {**sent, **delivered}
+
+    delivered: Dict[str, Dict[str, Dict]] = {}
+    with ThreadPoolExecutor(max_workers=len(channels)) as pool:
+        for sent in pool.map(post, range(len(channels)), channels, digests):
+            for brand, ads in sent.items():
+                delivered.setdefault(brand, {}).update((ad['id'], ad) for ad in ads)
+    return {brand: list(ads.values()) for brand, ads in delivered.items()}
+
+
+def run(args) -> int:
+    channels_file = args.channels or DIGEST_CHANNELS_FILE
+    channels = [None]
+    if channels_file and not (args.backfill or args.rerender or args.repost):
+        try:
+            channels = load_channels(channels_file)
+        except (OSError, ValueError) as e:
+            print(f"✗ Bad channel config {channels_file}: {e}")
+            return 1
+    elif not (args.backfill or args.rerender or args.brand_stats) and not SLACK_WEBHOOK_URL and not (SLACK_BOT_TOKEN and SLACK_CHANNEL):
+        print("✗ Set SLACK_WEBHOOK_URL, or SLACK_BOT_TOKEN and SLACK_CHANNEL")
+        return 1
+
+    if args.rerender or args.repost:
+        if not AD_CACHE_FILE.exists():
+            print(f"✗ No ad cache at {AD_CACHE_FILE}")
+            return 1
+        return replay_last_digest(DeduplicationStore(POSTED_ADS_FILE, LEGACY_POSTED_ADS_FILE), AdCache(AD_CACHE_FILE), post=args.repost)
+    if args.brand_stats:
+        print(BrandScheduler(DeduplicationStore(POSTED_ADS_FILE, LEGACY_POSTED_ADS_FILE)).report())
+        return 0
 
-def main():
     print("=" * 60)
     print("Foreplay to Slack - MAXIMUM EFFICIENCY")
     print(f"Fetching only {API_FETCH_LIMIT} ads/brand (~15 credits!)")
     print("=" * 60)
     
-    dedup = DeduplicationStore(POSTED_ADS_FILE)
-    print(f"\nDedup: {len(dedup.posted_ids)} previously posted")
-    
-    api = ForeplayAPI(FOREPLAY_API_KEY)
-    ads_by_brand = api.get_recent_ads(TRACKED_BRANDS, DAYS_LOOKBACK, dedup)
+    dedup = DeduplicationStore(POSTED_ADS_FILE, LEGACY_POSTED_ADS_FILE, bloom_path=DEDUP_BLOOM_FILE if DEDUP_BLOOM else None)
+    print(f"\nDedup: {len(dedup)} previously posted")
+
+    brand_cache = BrandCache(BRAND_CACHE_FILE)
+    if args.refresh_brands:
+        brand_cache.invalidate()
+    print(f"Brand cache: {len(brand_cache.entries)} brand IDs")
+
+    ad_cache = AdCache(AD_CACHE_FILE) if AD_CACHE else None
+    scheduler = BrandScheduler(dedup) if BRAND_SCHEDULER else None
+    api = ForeplayAPI(FOREPLAY_API_KEY, brand_cache, record=bool(FOREPLAY_RECORD_FILE), ad_cache=ad_cache,
+                      scheduler=scheduler)
+    if args.backfill:
+        since = datetime.strptime(args.since, '%Y-%m-%d').replace(tzinfo=timezone.utc) if args.since else None
+        code = backfill(api, dedup, args.backfill, since, args.cursor)
+        brand_cache.save()
+        print(f"\n{api.failure_report()}")
+        return code
+
+    checkpoint = None
+    if RUN_CHECKPOINT:
+        fingerprint = [DAYS_LOOKBACK, TRACKED_BRANDS if channels == [None] else
+                       [[c['name'], c['brands'], c.get('target_brands', 5)] for c in channels]]
+        checkpoint = RunCheckpoint(RUN_CHECKPOINT_FILE, fingerprint, brand_cache)
+
+    if checkpoint and checkpoint.digests is not None:
+        digests = checkpoint.digests
+        api.held_back = dict(checkpoint.held_back)
+        print(f"\nCheckpoint: resuming from {RUN_CHECKPOINT_FILE.name} - fetch phase already done, no API calls")
+    else:
+        if checkpoint:
+            # Brands scanned before the interruption aren't scanned (or paid for) again
+            api.scan_cache = dict(checkpoint.scans)
+            api.on_scan = checkpoint.record_scan
+            if checkpoint.resumed:
+                print(f"\nCheckpoint: resuming from {RUN_CHECKPOINT_FILE.name} - {len(checkpoint.scans)} brands already scanned")
+        if channels == [None]:
+            digests = [api.get_recent_ads(TRACKED_BRANDS, DAYS_LOOKBACK, dedup)]
+        else:
+            # Fan-out: a brand on several channels' lists is only scanned once
+            if api.scan_cache is None: api.scan_cache = {}
+            digests = []
+            for channel in channels:
+                print(f"\n=== {channel['name']}: {len(channel['brands'])} brands ===")
+                digests.append(api.get_recent_ads(channel['brands'], DAYS_LOOKBACK, dedup, channel.get('target_brands', 5)))
+        if checkpoint and not api.failures and not api.limiter.exhausted:
+            checkpoint.finish_fetch(digests, api.held_back)  # A rerun retries failed brands rather than reusing this result
+    brand_cache.save()
+    if scheduler is not None:
+        scheduler.save()
+    if FOREPLAY_RECORD_FILE:
+        api.save_recording(Path(FOREPLAY_RECORD_FILE))
+    if ad_cache is not None:
+        evicted = ad_cache.evict()
+        stats = ad_cache.stats()
+        print(f"Ad cache: {stats['ads']} ads, {stats['bytes'] / 1024:.0f} KB" + (f" ({evicted} evicted)" if evicted else ""))
+    if dedup.bloom is not None:
+        print(f"Dedup: {dedup.bloom_skips} lookups answered by the Bloom filter")
+    print(f"\n{api.failure_report()}")
     
-    total = sum(len(ads) for ads in ads_by_brand.values())
+    found = {ad['id'] for ads_by_brand in digests for ads in ads_by_brand.values() for ad in ads}
+    brands = {brand for ads_by_brand in digests for brand in ads_by_brand}
     print(f"\n{'=' * 60}")
-    print(f"Found: {total} new ads across {len(ads_by_brand)} brands")
+    print(f"Found: {len(found)} new ads across {len(brands)} brands")
     print(f"{'=' * 60}")
 
-    if not ads_by_brand:
+    if not found:
+        if api.failures:
+            print("\n✗ No ads found and API requests failed - not treating this as a quiet week.")
+            return 1
+        if api.limiter.exhausted:
+            # Brands past the floor were never checked; the checkpoint keeps the scans already paid for
+            print(f"\n✗ Stopped at the credit floor before finding new ads - not treating this as a quiet week."
+                  + (f" Kept {RUN_CHECKPOINT_FILE.name} to resume once credits are topped up." if checkpoint else ""))
+            return 1
         print("\nNo new ads from any brands in the lookback period.")
+        if checkpoint: checkpoint.clear()
         return 0
     
-    slack = SlackPoster(SLACK_WEBHOOK_URL)
-    slack.post_weekly_inspiration(ads_by_brand)
-    
+    # Only mark what actually reached Slack (on any channel), so failed brands are retried next run
+    ads_by_brand = post_digests(channels, digests, checkpoint)
+    if checkpoint:
+        pending = sum(len(set(d) - checkpoint.delivered(i)) for i, d in enumerate(digests))
+        checkpoint.set_phase('post', 'partial' if pending else 'done')
+    if not ads_by_brand:
+        print("\n✗ Nothing was posted to Slack")
+        return 1
+
     all_ids = [ad['id'] for ads in ads_by_brand.values() for ad in ads]
-    dedup.mark_batch_posted(all_ids)
+    # Advance each brand's watermark to its newest posted ad - but no further than the oldest new ad the
+    # cap held back, so that one is still fetched (and posted) on a later run while it's in the lookback
+    watermarks = {brand: min(max(ad.get('started_running') or 0 for ad in ads), api.held_back.get(brand, float('inf')))
+                  for brand, ads in ads_by_brand.items()}
+    brand_of = {ad['id']: brand for brand, ads in ads_by_brand.items() for ad in ads}
+    with METRICS.span('dedup_save'):
+        dedup.mark_batch_posted(all_ids, watermarks, brand_of, digest=True)
+        removed = dedup.compact()
+    if removed: print(f"Dedup: compacted {removed} IDs older than {DEDUP_RETENTION_DAYS} days")
+    if checkpoint:
+        if pending:
+            checkpoint.set_phase('mark', 'done')
+            print(f"Checkpoint: kept {RUN_CHECKPOINT_FILE.name} - rerun to post the {pending} brand digests that failed")
+        else:
+            checkpoint.clear()
     
     print(f"\n{'=' * 60}")
     print(f"✅ Complete! Used minimal credits")
@@ -319,5 +1828,28 @@ def main():
     return 0
 
 
+def main(argv: List[str] = None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Post new Foreplay ads from tracked brands to Slack')
+    parser.add_argument('--refresh-brands', action='store_true', help='Drop the brand ID cache and re-resolve every brand')
+    parser.add_argument('--backfill', metavar='BRAND', help="Record a brand's ad history as posted (no Slack post)")
+    parser.add_argument('--since', metavar='YYYY-MM-DD', help='With --backfill: stop at ads older than this date')
+    parser.add_argument('--cursor', help='With --backfill: resume from this cursor')
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--rerender', action='store_true', help='Print the last posted digest, rebuilt from the ad cache, as Slack JSON')
+    replay.add_argument('--repost', action='store_true', help='Post the last digest again from the ad cache (no Foreplay calls)')
+    parser.add_argument('--brand-stats', action='store_true', help="Print each brand's scan history (hit rate, new ads per credit) and exit")
+    parser.add_argument('--channels', metavar='FILE', help='Fan-out mode: post per-channel digests from this JSON config')
+    args = parser.parse_args(argv)
+
+    METRICS.reset()
+    if args.rerender or args.repost or args.brand_stats:
+        return run(args)  # Nothing is scanned, and --rerender's stdout must stay pure JSON
+    try:
+        return run(args)
+    finally:
+        emit_run_report()
+
+
 if __name__ == '__main__':
     exit(main())
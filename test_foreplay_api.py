@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 """
 Quick test script to verify Foreplay API connectivity
+
+Runs against the live API with FOREPLAY_API_KEY, or offline (no credits) against
+foreplay_fake_server.py:
+    FOREPLAY_BASE_URL=http://127.0.0.1:8765 FOREPLAY_API_KEY=fake python3 test_foreplay_api.py
 """
 
+import os
 import requests
 from datetime import datetime, timedelta
 
-FOREPLAY_API_KEY = 'ZW3RDgCTZyNmrht0aFe3foC9Wocg0XWLzNXnWOmZ0WeeEtQ7hyOcPcPcPNUlVi_8UHBX4ur3r7KNbjHIhEuUmO-Q'
-BASE_URL = 'https://public.api.foreplay.co'
+FOREPLAY_API_KEY = os.environ["FOREPLAY_API_KEY"]
+BASE_URL = os.environ.get('FOREPLAY_BASE_URL', 'https://public.api.foreplay.co')
 
 headers = {
     'Authorization': FOREPLAY_API_KEY,
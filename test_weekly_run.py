@@ -0,0 +1,212 @@
+"""
+Offline regression tests for the weekly run: main() against foreplay_fake_server.py, with every
+state file in a temp dir. No credits are spent and nothing reaches Slack.
+"""
+
+import contextlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('FOREPLAY_API_KEY', 'test')
+
+import foreplay_slack_automation as fsa
+from foreplay_fake_server import FakeForeplayServer, synthetic_fixtures
+
+DAY_MS = 86400000
+STATE_FILES = {
+    'POSTED_ADS_FILE': 'posted_ads.db',
+    'LEGACY_POSTED_ADS_FILE': 'posted_ads.json',
+    'DEDUP_BLOOM_FILE': 'posted_ads.bloom',
+    'BRAND_CACHE_FILE': 'brand_cache.json',
+    'AD_CACHE_FILE': 'ad_cache.db',
+    'RUN_CHECKPOINT_FILE': 'run_checkpoint.json',
+}
+
+
+def make_fixtures(ads_per_brand):
+    """One brand per entry of ads_per_brand, each with that many recent US image ads, newest first."""
+    now_ms = int(time.time() * 1000)
+    fixtures = {'brands': [], 'ads': {}}
+    for i, count in enumerate(ads_per_brand):
+        brand_id = f"brand-{i}"
+        fixtures['brands'].append({'id': brand_id, 'name': f"Brand {i}"})
+        fixtures['ads'][brand_id] = [{
+            'id': f"{brand_id}-ad-{j}",
+            'display_format': 'image',
+            'started_running': now_ms - (j + 1) * DAY_MS // 4,
+            'countries': ['US'],
+            'headline': f"Headline {j}",
+            'description': f"Copy for ad {j}",
+            'thumbnail': f"https://media.fake.invalid/{brand_id}/{j}.jpg",
+        } for j in range(count)]
+    return fixtures
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """Start a fake server for the given fixtures and point the module's state and URLs at it."""
+    servers = []
+
+    def start(fixtures, **server_args):
+        server = FakeForeplayServer(fixtures, **server_args).start()
+        servers.append(server)
+        for name, filename in STATE_FILES.items():
+            monkeypatch.setattr(fsa, name, tmp_path / filename)
+        monkeypatch.setattr(fsa, 'TRACKED_BRANDS', [b['name'] for b in fixtures['brands']])
+        monkeypatch.setattr(fsa, 'FOREPLAY_BASE_URL', server.url)
+        monkeypatch.setattr(fsa, 'SLACK_WEBHOOK_URL', f"{server.url}/slack/webhook")
+        # Nothing from the developer's environment may reach a real destination
+        for name in ('SLACK_BOT_TOKEN', 'SLACK_CHANNEL', 'DIGEST_CHANNELS_FILE', 'FOREPLAY_RECORD_FILE', 'RUN_REPORT_FILE'):
+            monkeypatch.setattr(fsa, name, None)
+        monkeypatch.setattr(fsa, 'SLACK_API_BASE', f"{server.url}/api")
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def run_main(server, argv=(), stdout=None):
+    server.reset_stats()
+    with contextlib.redirect_stdout(stdout or io.StringIO()):
+        return fsa.main(list(argv))
+
+
+def last_batch():
+    dedup = fsa.DeduplicationStore(fsa.POSTED_ADS_FILE)
+    try:
+        return dedup.last_batch(), {brand: dedup.watermark(brand) for brand in fsa.TRACKED_BRANDS}
+    finally:
+        dedup.close()
+
+
+def test_offline_run_posts_a_digest(offline):
+    server = offline(make_fixtures([2, 2]))
+    assert run_main(server) == 0
+    assert server.slack_messages
+    assert server.stats['/api/discovery/brands'] == 2
+    assert server.stats['credits_used'] > 0  # Charged by the fake server, not Foreplay
+    assert sorted(last_batch()[0]) == ['Brand 0', 'Brand 1']
+
+
+def test_cap_holds_back_ads_for_the_next_run(offline):
+    server = offline(make_fixtures([5]))
+    ads = {ad['id']: ad for ad in server.fixtures['ads']['brand-0']}
+
+    assert run_main(server) == 0
+    batch, watermarks = last_batch()
+    first = batch['Brand 0']
+    assert first == ['brand-0-ad-0', 'brand-0-ad-1', 'brand-0-ad-2']  # 3-per-brand cap, newest first
+    # The watermark stops at the oldest held-back ad, not the newest posted one
+    assert watermarks['Brand 0'] == ads['brand-0-ad-4']['started_running']
+
+    assert run_main(server) == 0
+    batch, watermarks = last_batch()
+    assert sorted(batch['Brand 0']) == ['brand-0-ad-3', 'brand-0-ad-4']  # Held back, and nothing posted twice
+    assert watermarks['Brand 0'] == ads['brand-0-ad-3']['started_running']  # Only moves forward
+
+    assert run_main(server) == 0  # Quiet week
+    assert not server.slack_messages
+    assert server.stats['/api/discovery/brands'] == 0  # Brand IDs came from the cache
+
+
+def test_dedup_across_runs(offline):
+    server = offline(make_fixtures([2, 2, 2]))
+    assert run_main(server) == 0
+    first, watermarks = last_batch()
+    assert {ad_id for ids in first.values() for ad_id in ids} == {f"brand-{i}-ad-{j}" for i in range(3) for j in range(2)}
+    assert all(watermarks.values())
+
+    # A new ad for one brand: only it is posted, the rest are deduplicated or below the watermark
+    new_ad = dict(server.fixtures['ads']['brand-1'][0], id='brand-1-ad-new', started_running=int(time.time() * 1000))
+    server.fixtures['ads']['brand-1'].insert(0, new_ad)
+    assert run_main(server) == 0
+    batch, _ = last_batch()
+    assert batch == {'Brand 1': ['brand-1-ad-new']}
+
+
+def test_checkpoint_resumes_after_slack_fails(offline, monkeypatch):
+    server = offline(make_fixtures([2, 2]))
+    monkeypatch.setattr(fsa, 'SLACK_WEBHOOK_URL', f"{server.url}/slack/broken")  # 404 from the fake server
+    assert run_main(server) == 1
+    assert fsa.RUN_CHECKPOINT_FILE.exists()
+    assert not fsa.POSTED_ADS_FILE.exists() or not last_batch()[0]
+    fetched = server.stats['/api/spyder/brand/ads']
+    assert fetched == 2
+
+    monkeypatch.setattr(fsa, 'SLACK_WEBHOOK_URL', f"{server.url}/slack/webhook")
+    assert run_main(server) == 0
+    assert server.stats['/api/spyder/brand/ads'] == 0  # Fetch phase reused, no credits spent again
+    assert server.stats['/api/discovery/brands'] == 0
+    assert server.slack_messages
+    assert sorted(last_batch()[0]) == ['Brand 0', 'Brand 1']
+    assert not fsa.RUN_CHECKPOINT_FILE.exists()
+
+
+def test_stale_brand_id_is_not_a_failure(offline):
+    server = offline(make_fixtures([2]))
+    cache = fsa.BrandCache(fsa.BRAND_CACHE_FILE)
+    cache.put('Brand 0', 'brand-gone', 'Brand 0')
+    cache.save()
+    assert run_main(server) == 0
+    assert 'failures' not in ' '.join(fsa.METRICS.report()['counters'])
+    assert fsa.BrandCache(fsa.BRAND_CACHE_FILE).get('Brand 0')['id'] == 'brand-0'
+    assert not fsa.RUN_CHECKPOINT_FILE.exists()
+
+
+def test_thread_replies_keep_brand_order(offline, monkeypatch):
+    server = offline(make_fixtures([1] * 5), latency_ms=20, jitter_ms=15, seed=1)
+    monkeypatch.setattr(fsa, 'SLACK_BOT_TOKEN', 'xoxb-test')
+    monkeypatch.setattr(fsa, 'SLACK_CHANNEL', 'C0TEST')
+    monkeypatch.setattr(fsa, 'SLACK_API_BASE', f"{server.url}/api")
+    chunk_digest = fsa.SlackPoster.chunk_digest
+    # One brand per reply, so there are several replies to keep in order
+    monkeypatch.setattr(fsa.SlackPoster, 'chunk_digest', staticmethod(
+        lambda header, sections, footer: chunk_digest(header, sections, footer, max_blocks=5)))
+    assert run_main(server) == 0
+    replies = [m for m in server.slack_messages if m.get('thread_ts')]
+    brands = [b['text']['text'] for m in replies for b in m['blocks'] if b['type'] == 'section' and b['text']['text'].startswith('*Brand')]
+    assert len(replies) == 5
+    assert brands == sorted(brands)
+
+
+def test_chunk_digest_limits():
+    brands = [f"Bench Brand {i:02d}" for i in range(40)]
+    fixtures = synthetic_fixtures(brands, ads_per_brand=3, active_ratio=1.0, seed=3)
+    ads_by_brand = {b['name']: fixtures['ads'][b['id']] for b in fixtures['brands']}
+    header, sections, footer = fsa.DigestRenderer().render(ads_by_brand, 'inspo')
+
+    for max_blocks, max_bytes in ((fsa.SLACK_MAX_BLOCKS, fsa.SLACK_MAX_PAYLOAD_BYTES), (12, 3000)):
+        chunks = fsa.SlackPoster.chunk_digest(header, sections, footer, max_blocks, max_bytes)
+        assert len(chunks) > 1
+        assert chunks[0]['blocks'][:len(header)] == header
+        assert chunks[-1]['blocks'][-len(footer):] == footer
+        assert [b for c in chunks for b in c['brands']] == [brand for brand, _ in sections]  # Each brand once, in order
+        for chunk in chunks:
+            assert len(chunk['blocks']) <= max_blocks
+            if len(chunk['brands']) > 1:  # A lone brand may exceed max_bytes; packed ones never do
+                assert len(fsa.json.dumps(chunk['blocks'], ensure_ascii=False).encode()) <= max_bytes
+
+
+def test_rerender_prints_only_the_digest(offline):
+    server = offline(make_fixtures([2]))
+    assert run_main(server) == 0
+    out = io.StringIO()
+    assert run_main(server, ['--rerender'], out) == 0
+    messages = json.loads(out.getvalue())  # No RUN_REPORT line after the JSON
+    assert messages[0]['brands'] == ['Brand 0']
+    assert server.stats['requests'] == 0
+
+
+def test_credit_floor_is_not_a_quiet_week(offline):
+    server = offline(make_fixtures([0] * 8), credits=fsa.CREDIT_FLOOR + 7)
+    out = io.StringIO()
+    assert run_main(server, stdout=out) == 1
+    assert 'Stopped at the credit floor' in out.getvalue()
+    assert fsa.RUN_CHECKPOINT_FILE.exists()
+    scanned = json.loads(fsa.RUN_CHECKPOINT_FILE.read_text())['scans']
+    assert scanned and len(scanned) < 8